@@ -18,9 +18,10 @@ from avicenna.generator import (
 )
 
 from avicenna.input import Input
+from avicenna.evaluation_cache import EvaluationCache
+from avicenna.checkpoint import Checkpoint, save_checkpoint, load_checkpoint
 from avicenna.pattern_learner import (
     AvicennaTruthTable,
-    AvicennaTruthTableRow,
     PatternLearner,
     AviIslearn,
 )
@@ -33,6 +34,9 @@ from returns.maybe import Maybe, Some, Nothing
 
 from debugging_framework.oracle import OracleResult
 
+# The number of best invariants each iteration generates new inputs for.
+MAX_CANDIDATES_PER_ITERATION = 20
+
 
 class Avicenna:
     """
@@ -62,6 +66,12 @@ class Avicenna:
         input_generator: Type[Generator] = None,
         pattern_learner: Type[PatternLearner] = None,
         timeout_seconds: Optional[int] = None,
+        processes: Optional[int] = None,
+        evaluation_cache: Optional[EvaluationCache] = None,
+        lazy_precision: bool = False,
+        precision_confidence: Optional[float] = None,
+        checkpoint_path: Optional[Path] = None,
+        checkpoint_interval: int = 1,
     ):
         """
         The constructor of :class:`~avicenna.Avicenna.` accepts a large number of
@@ -88,6 +98,17 @@ class Avicenna:
             During single execution the program gets called for each individual input.
         :param log: Toggle verbose logging.
         :param feature_learner: A constructor class of the RelevantFeatureLearner.
+        :param processes: Evaluate candidate constraints in this many worker processes.
+            The pool is started once and reused for all iterations of :meth:`explain`.
+        :param evaluation_cache: A cache of formula evaluation results. Pass the same
+            cache (or one backed by the same file) to later runs to reuse its results.
+        :param lazy_precision: Stop evaluating a candidate on further passing inputs once
+            it cannot reach the minimal precision anymore.
+        :param precision_confidence: In lazy mode, also stop once the confidence interval
+            of a candidate's precision at this level (e.g., 0.99) excludes the threshold.
+        :param checkpoint_path: Snapshot the learner state to this file every
+            :code:`checkpoint_interval` iterations; continue with :meth:`resume`.
+        :param checkpoint_interval: The number of iterations between two checkpoints.
         """
 
         self._start_time = None
@@ -98,6 +119,8 @@ class Avicenna:
         self._targeted_start_size: int = 10
         self._iteration = 0
         self.timeout_seconds = timeout_seconds
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
         self.start_time: Optional[int] = None
         self._data = None
         self._all_data = None
@@ -152,6 +175,15 @@ class Avicenna:
             "pattern_file": str(self.pattern_file),
             "patterns": self.patterns,
         }
+        if processes:
+            pattern_learner_param["processes"] = processes
+        if evaluation_cache is not None:
+            pattern_learner_param["evaluation_cache"] = evaluation_cache
+        if lazy_precision:
+            pattern_learner_param["lazy_precision"] = lazy_precision
+            pattern_learner_param["precision_confidence"] = precision_confidence
+        if issubclass(pattern_learner or AviIslearn, AviIslearn):
+            pattern_learner_param["max_results"] = MAX_CANDIDATES_PER_ITERATION
 
         self.pattern_learner = (
             pattern_learner(**pattern_learner_param)
@@ -160,8 +192,7 @@ class Avicenna:
         )
 
         # TruthTable
-        self.precision_truth_table = AvicennaTruthTable()
-        self.recall_truth_table = AvicennaTruthTable()
+        self.truth_table = AvicennaTruthTable()
 
         self.report = (
             MultipleFailureReport()
@@ -243,15 +274,64 @@ class Avicenna:
             self.start_time = int(time.time())
 
         new_inputs: Set[Input] = self.all_inputs.union(self.generate_more_inputs())
-        while self._do_more_iterations():
-            if self.timeout_seconds is not None:
-                if int(time.time()) - self.start_time > self.timeout_seconds:
-                    LOGGER.info("TIMEOUT")
-                    raise TimeoutError(self.timeout_seconds)
+        return self._explain(new_inputs)
 
-            new_inputs = self._loop(new_inputs)
+    def resume(self, path: Path) -> Optional[Tuple[Formula, float, float]]:
+        """
+        Continues :meth:`explain` from a checkpoint written by an earlier run with
+        the same grammar. The labeled inputs and the evaluated truth table are
+        restored, so neither the oracle nor any formula is run again for them.
+        """
+        if self.timeout_seconds is not None and self.start_time is None:
+            self.start_time = int(time.time())
+
+        checkpoint = load_checkpoint(path, self.grammar)
+        self._iteration = checkpoint.iteration
+        self.truth_table = checkpoint.truth_table
+        self.all_inputs = self.assign_feature_vector(checkpoint.inputs)
+        self.report.failures.update(checkpoint.failures)
+        self.best_candidates = checkpoint.best_candidates
+        if isinstance(self.pattern_learner, AviIslearn):
+            self.pattern_learner.update_inputs(
+                *self.pattern_learner.categorize_inputs(self.all_inputs)
+            )
+        LOGGER.info(f"Resuming after iteration {self._iteration} from {path}.")
+        return self._explain(checkpoint.pending_inputs)
+
+    def _explain(
+        self, new_inputs: Set[Input]
+    ) -> Optional[Tuple[Formula, float, float]]:
+        try:
+            while self._do_more_iterations():
+                if self.timeout_seconds is not None:
+                    if int(time.time()) - self.start_time > self.timeout_seconds:
+                        LOGGER.info("TIMEOUT")
+                        raise TimeoutError(self.timeout_seconds)
+
+                new_inputs = self._loop(new_inputs)
+                if (
+                    self.checkpoint_path is not None
+                    and self._iteration % self.checkpoint_interval == 0
+                ):
+                    self.save_checkpoint(self.checkpoint_path, new_inputs)
+        finally:
+            self.pattern_learner.close()
         return self.finalize()
 
+    def save_checkpoint(self, path: Path, pending_inputs: Set[Input] = None):
+        save_checkpoint(
+            path,
+            Checkpoint(
+                iteration=self._iteration,
+                inputs=self.all_inputs,
+                truth_table=self.truth_table,
+                pending_inputs=pending_inputs or set(),
+                failures=self.report.get_failures(),
+                best_candidates=self.best_candidates,
+            ),
+        )
+        LOGGER.info(f"Saved checkpoint of iteration {self._iteration} to {path}.")
+
     def _do_more_iterations(self):
         if self._iteration >= self._max_iterations:
             LOGGER.info("Terminate due to maximal iterations reached")
@@ -262,6 +342,9 @@ class Avicenna:
 
     def add_inputs(self, test_inputs: Set[Input]):
         self.all_inputs.update(test_inputs)
+        # Inputs get their dense ids when they enter the corpus; the truth table
+        # rows only keep bitmaps over these ids.
+        self.truth_table.index.positions(test_inputs)
         return test_inputs
 
     def construct_inputs(self, test_inputs: Set[Input]) -> Set[Input]:
@@ -296,12 +379,13 @@ class Avicenna:
 
         new_candidates = self.pattern_learner.learn_failure_invariants(
             test_inputs,
-            self.precision_truth_table,
-            self.recall_truth_table,
+            self.truth_table,
             exclusion_non_terminals,
         )
 
-        new_candidates = set([x[0] for x in new_candidates[:20]])
+        new_candidates = set(
+            [x[0] for x in new_candidates[:MAX_CANDIDATES_PER_ITERATION]]
+        )
 
         self.best_candidates = new_candidates
         new_inputs = (
@@ -323,8 +407,7 @@ class Avicenna:
         new_candidates = Exceptional.of(
             self.pattern_learner.learn_failure_invariants(
                 test_inputs,
-                self.precision_truth_table,
-                self.recall_truth_table,
+                self.truth_table,
                 exclusion_non_terminals,
             )
         ).bind(check_empty)
@@ -374,29 +457,7 @@ class Avicenna:
         )
 
     def _gather_candidates_with_scores(self) -> List[Tuple[Formula, float, float]]:
-        def meets_criteria(precision_value_, recall_value_):
-            return (
-                precision_value_ >= self.min_precision
-                and recall_value_ >= self.min_recall
-            )
-
-        candidates_with_scores = []
-
-        for idx, precision_row in enumerate(self.precision_truth_table):
-            assert isinstance(precision_row, AvicennaTruthTableRow)
-            precision_value = 1 - precision_row.eval_result()
-            recall_value = self.recall_truth_table[idx].eval_result()
-
-            if meets_criteria(precision_value, recall_value):
-                candidates_with_scores.append(
-                    (precision_row.formula, precision_value, recall_value)
-                )
-
-        candidates_with_scores.sort(
-            key=lambda x: (x[1], x[2], -len(x[0])), reverse=True
-        )
-
-        return candidates_with_scores
+        return self.truth_table.ranking(self.min_precision, self.min_recall)
 
     @staticmethod
     def _get_best_candidates(
@@ -448,9 +509,11 @@ class Avicenna:
         return test_inputs
 
     def assign_feature_vector(self, test_inputs: Set[Input]) -> Set[Input]:
-        collector = GrammarFeatureCollector(self.grammar)
+        # The features of an input do not change, so only the inputs that are
+        # new to the corpus are collected.
         for inp_ in test_inputs:
-            inp_.features = collector.collect_features(inp_)
+            if inp_.features is None:
+                inp_.features = self.collector.collect_features(inp_)
         return test_inputs
 
     def generate_inputs(self, candidate_set):
@@ -0,0 +1,200 @@
+import builtins
+import importlib
+import os
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Set, Dict, Optional, Union
+
+import numpy
+from fuzzingbook.Grammars import Grammar
+from isla.language import Formula, ISLaUnparser, parse_isla
+
+from debugging_framework.oracle import OracleResult
+
+from avicenna.input import Input
+from avicenna.pattern_learner import AvicennaTruthTable, AvicennaTruthTableRow
+from avicenna.report import Failure
+
+
+@dataclass
+class Checkpoint:
+    """
+    The state of :meth:`avicenna.Avicenna.explain` between two iterations: the
+    labeled inputs, the truth table, the failures of the report, and the inputs
+    generated for the next iteration, which have not been labeled yet.
+    """
+
+    iteration: int
+    inputs: Set[Input]
+    truth_table: AvicennaTruthTable
+    pending_inputs: Set[Input] = field(default_factory=set)
+    failures: Dict[Failure, Set[Input]] = field(default_factory=dict)
+    best_candidates: Set[Formula] = field(default_factory=set)
+
+
+def save_checkpoint(path: Union[str, Path], checkpoint: Checkpoint):
+    """
+    Writes the checkpoint as a compressed NumPy archive. Inputs are stored as
+    strings in the order of the truth table's input index, so the evaluation
+    matrix can be stored as is; formulas are stored in their ISLa syntax. The
+    archive is written next to `path` and then moved over it, so a crash while
+    writing leaves the previous checkpoint intact.
+    """
+    table = checkpoint.truth_table
+    index = table.index
+    index.positions(checkpoint.inputs)
+    failures = list(checkpoint.failures.items())
+    failing_positions = [
+        (failure_id, index.position(inp))
+        for failure_id, (_, failure_inputs) in enumerate(failures)
+        for inp in failure_inputs
+    ]
+    rows, columns = len(table), len(index)
+    inputs = [index[position] for position in range(columns)]
+
+    path = Path(path)
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            numpy.savez_compressed(
+                file,
+                iteration=numpy.array(checkpoint.iteration),
+                inputs=_strings([str(inp) for inp in inputs]),
+                labels=_strings([inp.oracle.name for inp in inputs]),
+                in_corpus=numpy.array(
+                    [inp in checkpoint.inputs for inp in inputs], bool
+                ),
+                pending_inputs=_strings(
+                    [str(inp) for inp in checkpoint.pending_inputs]
+                ),
+                formulas=_strings(
+                    [ISLaUnparser(row.formula).unparse() for row in table]
+                ),
+                results=table.results[:rows, :columns],
+                evaluated=table.evaluated[:rows, :columns],
+                stopped_early=numpy.array([row.stopped_early for row in table], bool),
+                failure_types=_strings(
+                    [
+                        _qualified_name(type(failure.exception))
+                        for failure, _ in failures
+                    ]
+                ),
+                failure_messages=_strings([failure.message for failure, _ in failures]),
+                failing_positions=numpy.array(failing_positions, int).reshape(-1, 2),
+                best_candidates=_strings(
+                    [
+                        ISLaUnparser(formula).unparse()
+                        for formula in checkpoint.best_candidates
+                    ]
+                ),
+            )
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def load_checkpoint(path: Union[str, Path], grammar: Grammar) -> Checkpoint:
+    with numpy.load(path, allow_pickle=False) as archive:
+        data = {key: archive[key] for key in archive.files}
+
+    table = AvicennaTruthTable()
+    inputs: List[Input] = [
+        Input.from_str(grammar, inp, OracleResult[label])
+        for inp, label in zip(data["inputs"], data["labels"])
+    ]
+    table.index.positions(inputs)
+    for formula, results, evaluated, stopped_early in zip(
+        data["formulas"], data["results"], data["evaluated"], data["stopped_early"]
+    ):
+        row = AvicennaTruthTableRow(
+            parse_isla(str(formula), grammar), table.index, results, evaluated
+        )
+        row.stopped_early = bool(stopped_early)
+        table.append(row)
+
+    failures: Dict[Failure, Set[Input]] = {
+        _failure(str(name), str(message)): set()
+        for name, message in zip(data["failure_types"], data["failure_messages"])
+    }
+    failure_keys = list(failures)
+    for failure_id, position in data["failing_positions"]:
+        failures[failure_keys[failure_id]].add(inputs[position])
+
+    return Checkpoint(
+        iteration=int(data["iteration"]),
+        inputs={inp for inp, in_corpus in zip(inputs, data["in_corpus"]) if in_corpus},
+        truth_table=table,
+        pending_inputs={
+            Input.from_str(grammar, str(inp)) for inp in data["pending_inputs"]
+        },
+        failures=failures,
+        best_candidates={
+            parse_isla(str(formula), grammar) for formula in data["best_candidates"]
+        },
+    )
+
+
+def _strings(values: List[str]) -> numpy.ndarray:
+    return numpy.array(values, dtype=str)
+
+
+# The exception types that could not be resolved on load, by qualified name, so
+# that all failures of one such type share a class.
+_UNRESOLVED_TYPES: Dict[str, type] = {}
+
+
+def _qualified_name(exception_type: type) -> str:
+    return f"{exception_type.__module__}.{exception_type.__qualname__}"
+
+
+def _exception_type(name: str) -> Optional[type]:
+    """The exception type of the qualified name, or None if it cannot be
+    imported. Bare names, as written by older checkpoints, are built-ins."""
+    module_name, _, qualname = name.rpartition(".")
+    if not module_name:
+        return getattr(builtins, name, None)
+    # Nested classes have dots in their qualified name as well.
+    while module_name:
+        module = sys.modules.get(module_name)
+        if module is None:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                module = None
+        if module is not None:
+            value = module
+            for attribute in qualname.split("."):
+                value = getattr(value, attribute, None)
+            return value
+        module_name, _, parent = module_name.rpartition(".")
+        qualname = f"{parent}.{qualname}"
+    return None
+
+
+def _failure(name: str, message: str) -> Failure:
+    failure = Failure(_exception(name, message))
+    # The message of a recreated exception may be rendered differently.
+    failure.message = message
+    return failure
+
+
+def _exception(name: str, message: str) -> Exception:
+    """Recreates an exception of the type with the given qualified name. Types
+    that cannot be imported are recreated as subclasses of :class:`Exception`
+    with the same name, one per name; types whose constructor needs more than
+    the message are instantiated without calling it."""
+    exception_type = _exception_type(name)
+    if not (isinstance(exception_type, type) and issubclass(exception_type, Exception)):
+        if name not in _UNRESOLVED_TYPES:
+            _UNRESOLVED_TYPES[name] = type(name.rpartition(".")[2], (Exception,), {})
+        exception_type = _UNRESOLVED_TYPES[name]
+    args = (message,) if message else ()
+    try:
+        return exception_type(*args)
+    except TypeError:
+        return exception_type.__new__(exception_type, *args)
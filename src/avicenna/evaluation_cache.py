@@ -0,0 +1,130 @@
+import functools
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Union
+
+from grammar_graph import gg
+from isla.evaluator import evaluate
+from isla.language import Formula, ISLaUnparser
+
+from avicenna.input import Input
+
+
+@functools.lru_cache(maxsize=4096)
+def formula_key(formula: Formula) -> str:
+    return ISLaUnparser(formula).unparse()
+
+
+def evaluate_formula(formula: Formula, inp: Input, graph: gg.GrammarGraph) -> bool:
+    """
+    Evaluates the formula on the input, skipping the evaluator if the input's
+    tree index already decides it.
+    """
+    result = inp.tree_index.decide(formula)
+    if result is None:
+        result = evaluate(formula, inp.tree, graph.grammar, graph=graph).is_true()
+    return result
+
+
+def input_key(inp: Input) -> str:
+    """The key of the input in the database, which the input keeps once built."""
+    return inp.stable_hash
+
+
+class EvaluationCache:
+    """
+    Remembers the result of evaluating a formula on an input. Entries are kept
+    in memory with least-recently-used eviction and, if a path is given, in an
+    SQLite database that outlives the process. Share one cache between
+    :class:`~avicenna.Avicenna` instances (or point several at the same file) to
+    skip evaluations that have been done before.
+    """
+
+    def __init__(
+        self, max_size: int = 100_000, path: Optional[Union[str, Path]] = None
+    ):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Tuple[str, str], bool] = OrderedDict()
+        self._pending: Dict[Tuple[str, str], bool] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._connection = sqlite3.connect(str(path))
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations "
+                "(formula TEXT, input TEXT, result INTEGER, "
+                "PRIMARY KEY (formula, input))"
+            )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, formula: Formula, inp: Input) -> Tuple[str, str]:
+        return formula_key(formula), input_key(inp)
+
+    def get(self, formula: Formula, inp: Input) -> Optional[bool]:
+        key = self._key(formula, inp)
+        result = self._entries.get(key)
+        if result is None:
+            result = self._load(key)
+            if result is not None:
+                self._remember(key, result)
+        else:
+            self._entries.move_to_end(key)
+
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, formula: Formula, inp: Input, result: bool):
+        key = self._key(formula, inp)
+        self._remember(key, result)
+        if self._connection is not None:
+            self._pending[key] = result
+
+    def evaluate(self, formula: Formula, inp: Input, graph: gg.GrammarGraph) -> bool:
+        result = self.get(formula, inp)
+        if result is None:
+            result = evaluate_formula(formula, inp, graph)
+            self.put(formula, inp, result)
+        return result
+
+    def flush(self):
+        """Writes the results added since the last flush to the database."""
+        if self._connection is None or not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?)",
+                [
+                    (formula, inp, int(result))
+                    for (formula, inp), result in self._pending.items()
+                ],
+            )
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _remember(self, key: Tuple[str, str], result: bool):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: Tuple[str, str]) -> Optional[bool]:
+        if self._connection is None:
+            return None
+        if key in self._pending:
+            return self._pending[key]
+        row = self._connection.execute(
+            "SELECT result FROM evaluations WHERE formula = ? AND input = ?", key
+        ).fetchone()
+        return None if row is None else bool(row[0])
@@ -1,11 +1,13 @@
 from functools import lru_cache
-from typing import List, Dict, Optional, Any, Type
+from typing import List, Dict, Optional, Any, Type, Tuple
 from abc import ABC, abstractmethod
 
-from fuzzingbook.Grammars import is_nonterminal, Grammar
-from isla.language import DerivationTree
+import numpy
+
+from fuzzingbook.Grammars import Grammar
 
 from avicenna.input import Input
+from avicenna.tree_index import TreeIndex
 from avicenna.features import (
     ExistenceFeature,
     DerivationFeature,
@@ -14,6 +16,7 @@ from avicenna.features import (
     Feature,
     FeatureVector,
     FeatureFactory,
+    FeatureSpace,
 )
 
 DEFAULT_FEATURE_TYPES: List[Type[Feature]] = [
@@ -31,6 +34,8 @@ class FeatureCollector(ABC):
         self.grammar = grammar
         feature_types = feature_types if feature_types else DEFAULT_FEATURE_TYPES
         self.features = self.construct_features(feature_types)
+        self.space = FeatureSpace.for_features(tuple(self.features))
+        self.feature_ids = self.space.ids_of(self.features)
 
     def construct_features(self, feature_types: List[Type[Feature]]) -> List[Feature]:
         factory = FeatureFactory(self.grammar)
@@ -43,26 +48,30 @@ class FeatureCollector(ABC):
 
 class GrammarFeatureCollector(FeatureCollector):
     def collect_features(self, test_input: Input) -> FeatureVector:
-        feature_vector = FeatureVector(str(test_input))
-
-        for feature in self.features:
-            feature_vector.set_feature(feature, feature.default_value)
+        feature_vector = FeatureVector(str(test_input), space=self.space)
+        feature_vector.set_values(
+            self.feature_ids, self.space.defaults[self.feature_ids]
+        )
 
-        self.set_features(test_input.tree, feature_vector)
+        self.set_indexed_features(test_input.tree_index, feature_vector)
         return feature_vector
 
-    def set_features(self, tree: DerivationTree, feature_vector: FeatureVector):
-        (node, children) = tree
-
-        corresponding_features_1d = self.get_corresponding_feature(node)
-
-        for corresponding_feature in corresponding_features_1d:
-            value = corresponding_feature.evaluate(tree)
-            feature_vector.set_feature(corresponding_feature, value)
+    def set_indexed_features(self, index: TreeIndex, feature_vector: FeatureVector):
+        feature_ids: List[int] = []
+        values: List[Any] = []
+        for path, subtree in index:
+            for feature_id, feature in self.get_corresponding_ids(subtree.value):
+                feature_ids.append(feature_id)
+                values.append(feature.evaluate_indexed(index, path))
+        if feature_ids:
+            feature_vector.set_values(numpy.array(feature_ids), values)
 
-        for child in children:
-            if is_nonterminal(child[0]):
-                self.set_features(child, feature_vector)
+    @lru_cache
+    def get_corresponding_ids(self, current_node: str) -> List[Tuple[int, Feature]]:
+        return [
+            (self.space.ids[feature], feature)
+            for feature in self.get_corresponding_feature(current_node)
+        ]
 
     @lru_cache
     def get_corresponding_feature(self, current_node: str) -> List[Feature]:
@@ -0,0 +1,147 @@
+from typing import Optional, Sequence, Set, Type
+
+import numpy
+import z3
+from isla import language
+
+from avicenna.features import (
+    Feature,
+    ExistenceFeature,
+    NumericFeature,
+    LengthFeature,
+)
+from avicenna.input import Input
+
+# Comparisons `value op constant`, and the comparison with the operands swapped.
+COMPARISONS = {
+    z3.Z3_OP_GE: (numpy.greater_equal, z3.Z3_OP_LE),
+    z3.Z3_OP_GT: (numpy.greater, z3.Z3_OP_LT),
+    z3.Z3_OP_LE: (numpy.less_equal, z3.Z3_OP_GE),
+    z3.Z3_OP_LT: (numpy.less, z3.Z3_OP_GT),
+}
+
+
+class FeatureBound:
+    """
+    A formula that compares the numeric value or the length of a nonterminal
+    with a constant, such that it can be decided from the maximum of these
+    values, which is what the feature vector of an input keeps:
+
+    - `exists <X> elem in start: (>= (str.to.int elem) c)` holds iff the
+      maximal value of <X> is at least c (likewise for `>`).
+    - `exists <X> elem in start: (>= (str.len elem) c)` holds iff <X> occurs
+      and its maximal length is at least c (likewise for `>`).
+    - `forall <X> elem in start: (<= (str.len elem) c)` holds iff <X> does not
+      occur or its maximal length is at most c (likewise for `<`).
+
+    The universal bound on numeric values is not supported: `str.to.int` is
+    false for instances that are not numbers, which the maximum does not show.
+    """
+
+    def __init__(
+        self,
+        feature_type: Type[Feature],
+        nonterminal: str,
+        comparison: int,
+        constant: int,
+        universal: bool,
+    ):
+        self.feature = feature_type(nonterminal)
+        self.existence = ExistenceFeature(nonterminal)
+        self.compare = COMPARISONS[comparison][0]
+        self.constant = constant
+        self.universal = universal
+
+    @staticmethod
+    def from_formula(
+        formula: language.Formula, numeric_nonterminals: Set[str]
+    ) -> Optional["FeatureBound"]:
+        if not isinstance(formula, language.QuantifiedFormula) or not isinstance(
+            formula.in_variable, language.Constant
+        ):
+            return None
+        if formula.bind_expression is not None or not isinstance(
+            formula.inner_formula, language.SMTFormula
+        ):
+            return None
+
+        expression = formula.inner_formula.formula
+        comparison = expression.decl().kind()
+        if comparison not in COMPARISONS:
+            return None
+        term, constant = expression.children()
+        if _constant(term) is not None:
+            term, constant = constant, term
+            comparison = COMPARISONS[comparison][1]
+        constant = _constant(constant)
+        if constant is None or term.num_args() != 1:
+            return None
+        if str(term.arg(0)) != formula.bound_variable.name:
+            return None
+
+        nonterminal = formula.bound_variable.n_type
+        universal = isinstance(formula, language.ForallFormula)
+        is_upper_bound = comparison in (z3.Z3_OP_LE, z3.Z3_OP_LT)
+        if universal != is_upper_bound:
+            return None
+        if term.decl().kind() == z3.Z3_OP_SEQ_LENGTH:
+            return FeatureBound(
+                LengthFeature, nonterminal, comparison, constant, universal
+            )
+        if (
+            term.decl().kind() == z3.Z3_OP_STR_TO_INT
+            and not universal
+            and nonterminal in numeric_nonterminals
+        ):
+            return FeatureBound(
+                NumericFeature, nonterminal, comparison, constant, universal
+            )
+        return None
+
+    def evaluate(self, inputs: Sequence[Input]) -> Optional[numpy.ndarray]:
+        """
+        The truth values for all inputs, or None if an input lacks the features,
+        in which case the formula has to be evaluated on the trees.
+        """
+        if any(
+            inp.features is None
+            or not inp.features.has_feature(self.feature)
+            or not inp.features.has_feature(self.existence)
+            for inp in inputs
+        ):
+            return None
+
+        values = numpy.array(
+            [inp.features.get_feature_value(self.feature) for inp in inputs],
+            dtype=float,
+        )
+        if isinstance(self.feature, NumericFeature):
+            # `str.to.int` truncates decimals, which preserves the maximum; an
+            # input without numeric instances has the maximum -inf.
+            return self.compare(numpy.trunc(values), self.constant)
+
+        present = numpy.array(
+            [inp.features.get_feature_value(self.existence) for inp in inputs],
+            dtype=bool,
+        )
+        holds = self.compare(values, self.constant)
+        return (~present | holds) if self.universal else (present & holds)
+
+
+def _constant(expression: z3.ExprRef) -> Optional[int]:
+    """The value of an integer literal or of `str.to.int` of a string literal,
+    with the semantics of the ISLa evaluator."""
+    if z3.is_int_value(expression):
+        return expression.as_long()
+    if expression.decl().kind() == z3.Z3_OP_STR_TO_INT and z3.is_string_value(
+        expression.arg(0)
+    ):
+        value = expression.arg(0).as_string()
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return int(float(value))
+            except ValueError:
+                return None
+    return None
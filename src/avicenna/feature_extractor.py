@@ -5,7 +5,6 @@ import warnings
 
 import numpy as np
 from pandas import DataFrame
-from grammar_graph.gg import GrammarGraph
 import shap
 from fuzzingbook.Grammars import Grammar
 from lightgbm import LGBMClassifier
@@ -15,9 +14,18 @@ from sklearn.tree import DecisionTreeClassifier
 
 from debugging_framework.oracle import OracleResult
 
-from avicenna.feature_collector import Feature, FeatureFactory, DEFAULT_FEATURE_TYPES
+from avicenna.feature_collector import (
+    Feature,
+    FeatureFactory,
+    FeatureSpace,
+    DEFAULT_FEATURE_TYPES,
+)
+from avicenna.grammar_analysis import analyze
 from avicenna.input import Input
 
+# The value of a numeric feature without any number in the input.
+NO_NUMBER = -(2**32)
+
 # Suppress the specific SHAP warning
 warnings.filterwarnings(
     "ignore",
@@ -39,9 +47,11 @@ class RelevantFeatureLearner(ABC):
     ):
         self.grammar = grammar
         self.features = self.construct_features(feature_types or DEFAULT_FEATURE_TYPES)
+        self.space = FeatureSpace.for_features(tuple(self.features))
+        self.feature_ids = self.space.ids_of(self.features)
         self.top_n = top_n
         self.threshold = threshold
-        self.graph = GrammarGraph.from_grammar(grammar)
+        self.analysis = analyze(grammar)
         self.prune_parent_correlation = prune_parent_correlation
 
     def construct_features(self, feature_types: List[Type[Feature]]) -> List[Feature]:
@@ -86,11 +96,11 @@ class RelevantFeatureLearner(ABC):
     ) -> bool:
         if (
             self.prune_parent_correlation
-            and self.graph.reachable(
+            and self.analysis.reaches(
                 primary_feature.non_terminal, correlating_feature.non_terminal
             )
             and not (
-                self.graph.reachable(
+                self.analysis.reaches(
                     correlating_feature.non_terminal, primary_feature.non_terminal
                 )
             )
@@ -115,24 +125,42 @@ class RelevantFeatureLearner(ABC):
             case _:
                 return -1
 
-    def get_learning_data(self, test_inputs: Set[Input]) -> Tuple[DataFrame, List[int]]:
-        records = [
-            {
-                feature: inp.features.get_feature_value(feature)
-                for feature in self.features
-            }
-            for inp in test_inputs
-            if inp.oracle != OracleResult.UNDEFINED
-        ]
+    def get_feature_ids(self, space: FeatureSpace) -> np.ndarray:
+        """The ids of the learner's features in the space of a feature vector."""
+        if space is self.space:
+            return self.feature_ids
+        return space.ids_of(self.features)
 
-        df = DataFrame.from_records(records).replace(-np.inf, -(2**32))
-        labels = [
-            self.map_result(inp.oracle)
-            for inp in test_inputs
-            if inp.oracle != OracleResult.UNDEFINED
+    def get_learning_data(self, test_inputs: Set[Input]) -> Tuple[DataFrame, List[int]]:
+        matrix, features, labels = self.get_learning_matrix(test_inputs)
+        return DataFrame(matrix, columns=features, copy=False), labels
+
+    def get_learning_matrix(
+        self, test_inputs: Set[Input], dtype: Any = np.float64
+    ) -> Tuple[np.ndarray, List[Feature], List[int]]:
+        """
+        The feature values of the inputs with a defined oracle, one row per
+        input, and the labels of the inputs. Missing numeric values are written
+        as `NO_NUMBER`, and the features that are constant over all inputs are
+        dropped; the remaining features label the columns.
+        """
+        test_inputs = [
+            inp for inp in test_inputs if inp.oracle != OracleResult.UNDEFINED
         ]
+        matrix = np.empty((len(test_inputs), len(self.features)), dtype=dtype)
+        for row, inp in zip(matrix, test_inputs):
+            values = inp.features.get_feature_values(
+                self.get_feature_ids(inp.features.space)
+            )
+            values[values == -np.inf] = NO_NUMBER
+            row[:] = values
+        labels = [self.map_result(inp.oracle) for inp in test_inputs]
 
-        return df.drop(columns=df.columns[df.nunique() == 1]), labels
+        varying = matrix.min(axis=0, initial=np.inf) != matrix.max(
+            axis=0, initial=-np.inf
+        )
+        features = [feature for feature, keep in zip(self.features, varying) if keep]
+        return matrix[:, varying], features, labels
 
 
 class SKLearFeatureRelevanceLearner(RelevantFeatureLearner, ABC):
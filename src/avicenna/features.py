@@ -1,29 +1,39 @@
-from typing import List, Set, Dict, Optional, Any
-import re
+from typing import List, Set, Dict, Optional, Any, Iterable, Sequence, Tuple
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from functools import lru_cache
+
+import numpy
 
 from debugging_framework.oracle import OracleResult
 
-from fuzzingbook.Grammars import is_nonterminal, Grammar, reachable_nonterminals
+from fuzzingbook.Grammars import is_nonterminal, Grammar
 from isla.language import DerivationTree
 
+from avicenna.grammar_analysis import analyze, is_numeric
+from avicenna.tree_index import TreeIndex, Path
+
 
 class Feature(ABC):
     def __init__(self, non_terminal: str):
         self.non_terminal = non_terminal
 
     def __repr__(self) -> str:
-        return (
-            self._repr()
-            .replace('"', "&quot;")
-            .replace(",", "&comma;")
-            .replace("[", "&lsqb;")
-            .replace("]", "&rsqb;")
-            .replace("{", "&lcub;")
-            .replace("}", "&rcub;")
-            .replace(":", "&colon;")
-        )
+        # Features are hashed and compared by their representation, so it is
+        # built once; Python caches the hash of the string itself.
+        key = self.__dict__.get("_key")
+        if key is None:
+            key = (
+                self._repr()
+                .replace('"', "&quot;")
+                .replace(",", "&comma;")
+                .replace("[", "&lsqb;")
+                .replace("]", "&rsqb;")
+                .replace("{", "&lcub;")
+                .replace("}", "&rcub;")
+                .replace(":", "&colon;")
+            )
+            self._key = key
+        return key
 
     @abstractmethod
     def _repr(self) -> str:
@@ -34,7 +44,7 @@ class Feature(ABC):
 
     def __eq__(self, other):
         if isinstance(other, type(self)):
-            return self.__hash__() == hash(other)
+            return self.__repr__() == other.__repr__()
         return False
 
     @abstractmethod
@@ -49,6 +59,10 @@ class Feature(ABC):
     def evaluate(self, subtree: DerivationTree) -> Any:
         raise NotImplementedError
 
+    def evaluate_indexed(self, index: TreeIndex, path: Path) -> Any:
+        """Evaluates the feature on the subtree at `path` of an indexed tree."""
+        return self.evaluate(index.subtrees[path])
+
     @classmethod
     @abstractmethod
     def factory_method(cls, grammar):
@@ -125,16 +139,22 @@ class NumericFeature(Feature):
         return float
 
     def evaluate(self, subtree: DerivationTree) -> Any:
+        return self.to_number(tree_to_string(subtree))
+
+    def evaluate_indexed(self, index: TreeIndex, path: Path) -> Any:
+        return self.to_number(index.strings[path])
+
+    def to_number(self, value: str) -> Any:
         try:
-            value = float(tree_to_string(subtree))
-            return value
+            return float(value)
         except ValueError:
             return self.default_value
 
     @classmethod
     def factory_method(cls, grammar) -> List[Feature]:
-        derivable_chars = cls.get_derivable_chars(grammar)
-        return cls.get_features(derivable_chars)
+        return [
+            cls(non_terminal) for non_terminal in analyze(grammar).numeric_nonterminals
+        ]
 
     @classmethod
     def get_derivable_chars(cls, grammar: Grammar) -> Dict[str, Set[str]]:
@@ -143,49 +163,9 @@ class NumericFeature(Feature):
         :param grammar: The input grammar.
         :return: A mapping from each rule to a set of derivable characters.
         """
-        # Regex for non-terminal symbols in expansions
-        re_non_terminal = re.compile(r"(<[^<> ]*>)")
-
-        # Mapping from non-terminals to derivable terminal chars
-        derivable_chars = defaultdict(set)
-
-        # Populate initial derivable_chars
-        for rule, expansions in grammar.items():
-            for expansion in expansions:
-                # Remove non-terminal symbols and whitespace from expansion
-                terminals = re.sub(re_non_terminal, "", expansion)
-                # Add each terminal char to the set of derivable chars
-                for char in terminals:
-                    derivable_chars[rule].add(char)
-
-        # Update derivable_chars until convergence
-        while True:
-            if not cls.update_derivable_chars(grammar, derivable_chars):
-                break
-
-        return derivable_chars
-
-    @classmethod
-    def update_derivable_chars(
-        cls, grammar: Grammar, derivable_chars: Dict[str, Set[str]]
-    ) -> bool:
-        """
-        Update the mapping of derivable characters for each rule.
-        :param grammar: The input grammar.
-        :param derivable_chars: The existing mapping of derivable characters.
-        :return: True if any set of derivable chars was updated, False otherwise.
-        """
-        updated = False
-        for rule in grammar:
-            for reachable_rule in reachable_nonterminals(grammar, rule):
-                before_update = len(derivable_chars[rule])
-                derivable_chars[rule].update(derivable_chars[reachable_rule])
-                after_update = len(derivable_chars[rule])
-
-                # Set of derivable chars was updated
-                if after_update > before_update:
-                    updated = True
-        return updated
+        return {
+            rule: set(chars) for rule, chars in analyze(grammar).derivable_chars.items()
+        }
 
     @classmethod
     def get_features(cls, derivable_chars: Dict[str, Set[str]]) -> List[Feature]:
@@ -194,19 +174,11 @@ class NumericFeature(Feature):
         :param derivable_chars: The mapping of derivable characters.
         :return: A list of NumericInterpretation features.
         """
-        features = []
-        numeric_chars = {"0", "1", "2", "3", "4", "5", "6", "7", "8", "9"}
-        numeric_symbols = {".", "-"}
-
-        for non_terminal, chars in derivable_chars.items():
-            non_numeric_chars = (chars - numeric_chars) - numeric_symbols
-            has_numeric_chars = len(chars.intersection(numeric_chars)) > 0
-
-            # Rule derives only numeric characters and at least one numeric character
-            if len(non_numeric_chars) == 0 and has_numeric_chars:
-                features.append(cls(non_terminal))
-
-        return features
+        return [
+            cls(non_terminal)
+            for non_terminal, chars in derivable_chars.items()
+            if is_numeric(chars)
+        ]
 
 
 class LengthFeature(Feature):
@@ -223,6 +195,9 @@ class LengthFeature(Feature):
     def evaluate(self, subtree: DerivationTree) -> Any:
         return len(tree_to_string(subtree))
 
+    def evaluate_indexed(self, index: TreeIndex, path: Path) -> Any:
+        return index.length(path)
+
     @classmethod
     def factory_method(cls, grammar) -> List[Feature]:
         features = []
@@ -250,27 +225,120 @@ class FeatureFactory:
         return all_features
 
 
+class FeatureSpace:
+    """
+    Dense integer ids for a list of features. A :class:`FeatureVector` stores
+    its values in an array indexed by these ids, so collecting features and
+    building feature matrices write to arrays instead of hashing features.
+    Features that are not part of the space yet get the next id on first use.
+    """
+
+    def __init__(self, features: Iterable[Feature] = ()):
+        self.features: List[Feature] = []
+        self.ids: Dict[Feature, int] = {}
+        self.__defaults = numpy.empty(0)
+        for feature in features:
+            self.intern(feature)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def for_features(features: Tuple[Feature, ...]) -> "FeatureSpace":
+        """The space shared by all collectors and learners with these features."""
+        return FeatureSpace(features)
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def intern(self, feature: Feature) -> int:
+        feature_id = self.ids.get(feature)
+        if feature_id is None:
+            feature_id = len(self.features)
+            self.features.append(feature)
+            self.ids[feature] = feature_id
+        return feature_id
+
+    def ids_of(self, features: Sequence[Feature]) -> numpy.ndarray:
+        return numpy.array([self.intern(feature) for feature in features], dtype=int)
+
+    @property
+    def defaults(self) -> numpy.ndarray:
+        """The default value of each feature, by id."""
+        if len(self.__defaults) != len(self.features):
+            self.__defaults = numpy.array(
+                [feature.default_value for feature in self.features], dtype=float
+            )
+        return self.__defaults
+
+
 class FeatureVector:
+    """
+    The feature values of an input, kept in an array indexed by the ids of a
+    :class:`FeatureSpace`. The ids of the features that have been set are
+    marked, so :attr:`features` still yields a dict of exactly those.
+    """
+
     def __init__(
         self,
         test_input: str,
         result: Optional[OracleResult] = None,
+        space: Optional[FeatureSpace] = None,
     ):
         self.test_input = test_input
         self.result = result
-        self.features: Dict[Feature, Any] = dict()
+        self.space = space if space is not None else FeatureSpace()
+        self.values = numpy.empty(len(self.space), dtype=float)
+        self.is_set = numpy.zeros(len(self.space), dtype=bool)
+
+    @property
+    def features(self) -> Dict[Feature, Any]:
+        values = self.values.tolist()
+        return {
+            self.space.features[feature_id]: values[feature_id]
+            for feature_id in numpy.flatnonzero(self.is_set)
+        }
+
+    def has_feature(self, feature: Feature) -> bool:
+        feature_id = self.space.ids.get(feature)
+        return (
+            feature_id is not None
+            and feature_id < len(self.is_set)
+            and bool(self.is_set[feature_id])
+        )
 
     def get_feature_value(self, feature: Feature) -> Any:
-        if feature in self.features:
-            return self.features[feature]
+        if self.has_feature(feature):
+            return self.values[self.space.ids[feature]].item()
         else:
             return feature.default_value
 
+    def get_feature_values(self, feature_ids: numpy.ndarray) -> numpy.ndarray:
+        """The values of the features with the given ids, or their defaults."""
+        self._grow()
+        values = self.space.defaults[feature_ids]
+        is_set = self.is_set[feature_ids]
+        values[is_set] = self.values[feature_ids[is_set]]
+        return values
+
     def set_feature(self, feature: Feature, value: any):
-        if feature in self.features.keys():
-            self.features[feature] = max(value, self.features[feature])
-        else:
-            self.features[feature] = value
+        self.set_values(numpy.array([self.space.intern(feature)]), [value])
+
+    def set_values(self, feature_ids: numpy.ndarray, values: Sequence[Any]):
+        """Sets the features with the given ids, keeping the maximum value of
+        each feature; ids may repeat."""
+        self._grow()
+        values = numpy.asarray(values, dtype=float)
+        unset = feature_ids[~self.is_set[feature_ids]]
+        self.values[unset] = -numpy.inf
+        self.is_set[feature_ids] = True
+        numpy.maximum.at(self.values, feature_ids, values)
+
+    def _grow(self):
+        missing = len(self.space) - len(self.values)
+        if missing > 0:
+            self.values = numpy.concatenate((self.values, numpy.empty(missing)))
+            self.is_set = numpy.concatenate(
+                (self.is_set, numpy.zeros(missing, dtype=bool))
+            )
 
     def get_features(self) -> Dict[Feature, Any]:
         return self.features
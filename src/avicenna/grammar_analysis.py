@@ -0,0 +1,114 @@
+import hashlib
+import json
+import re
+from typing import Dict, List, Set, Tuple
+
+import numpy
+from fuzzingbook.Grammars import Grammar, exp_string
+
+RE_NONTERMINAL = re.compile(r"(<[^<> ]*>)")
+NUMERIC_CHARS = set("0123456789")
+NUMERIC_SYMBOLS = {".", "-"}
+
+
+def is_numeric(chars: Set[str]) -> bool:
+    """Whether the characters contain a digit and nothing but numeric symbols."""
+    return chars <= NUMERIC_CHARS | NUMERIC_SYMBOLS and bool(chars & NUMERIC_CHARS)
+
+
+class GrammarAnalysis:
+    """
+    The static properties of a grammar that feature factories and learners
+    look up: the symbols of each expansion, which nonterminals occur below
+    which (as a boolean matrix over the nonterminals), the terminal characters
+    each nonterminal can derive, and the nonterminals that can derive the
+    empty string or only numbers. Use :func:`analyze` to share one analysis
+    per grammar.
+    """
+
+    def __init__(self, grammar: Grammar):
+        self.nonterminals: List[str] = list(grammar)
+        self.ids: Dict[str, int] = {
+            nonterminal: idx for idx, nonterminal in enumerate(self.nonterminals)
+        }
+        self.expansions: Dict[str, List[Tuple[str, ...]]] = {
+            nonterminal: [
+                tuple(
+                    symbol
+                    for symbol in RE_NONTERMINAL.split(exp_string(expansion))
+                    if symbol
+                )
+                for expansion in expansions
+            ]
+            for nonterminal, expansions in grammar.items()
+        }
+
+        # reachable[i, j] iff the j-th nonterminal occurs strictly below the i-th.
+        self.reachable = numpy.zeros((len(self.nonterminals),) * 2, dtype=bool)
+        for nonterminal, expansions in self.expansions.items():
+            for symbols in expansions:
+                for symbol in symbols:
+                    if symbol in self.ids:
+                        self.reachable[self.ids[nonterminal], self.ids[symbol]] = True
+        for idx in range(len(self.nonterminals)):
+            self.reachable |= numpy.outer(self.reachable[:, idx], self.reachable[idx])
+
+        terminal_chars = {
+            nonterminal: {
+                char
+                for symbols in expansions
+                for symbol in symbols
+                if symbol not in self.ids and not RE_NONTERMINAL.fullmatch(symbol)
+                for char in symbol
+            }
+            for nonterminal, expansions in self.expansions.items()
+        }
+        self.derivable_chars: Dict[str, Set[str]] = {
+            nonterminal: terminal_chars[nonterminal].union(
+                *(terminal_chars[other] for other in self.reachable_from(nonterminal))
+            )
+            for nonterminal in self.nonterminals
+        }
+
+        self.nullable: Set[str] = set()
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, expansions in self.expansions.items():
+                if nonterminal not in self.nullable and any(
+                    all(symbol in self.nullable for symbol in symbols)
+                    for symbols in expansions
+                ):
+                    self.nullable.add(nonterminal)
+                    changed = True
+
+        self.numeric_nonterminals: List[str] = [
+            nonterminal
+            for nonterminal, chars in self.derivable_chars.items()
+            if is_numeric(chars)
+        ]
+
+    def reaches(self, nonterminal: str, other: str) -> bool:
+        """Whether `other` occurs strictly below `nonterminal`."""
+        return bool(self.reachable[self.ids[nonterminal], self.ids[other]])
+
+    def reachable_from(self, nonterminal: str) -> Set[str]:
+        return {
+            self.nonterminals[idx]
+            for idx in numpy.flatnonzero(self.reachable[self.ids[nonterminal]])
+        }
+
+
+_ANALYSES: Dict[str, GrammarAnalysis] = {}
+
+
+def grammar_fingerprint(grammar: Grammar) -> str:
+    return hashlib.sha256(json.dumps(grammar, default=str).encode()).hexdigest()
+
+
+def analyze(grammar: Grammar) -> GrammarAnalysis:
+    """The analysis of the grammar, computed once per distinct grammar."""
+    fingerprint = grammar_fingerprint(grammar)
+    if fingerprint not in _ANALYSES:
+        _ANALYSES[fingerprint] = GrammarAnalysis(grammar)
+    return _ANALYSES[fingerprint]
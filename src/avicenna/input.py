@@ -1,3 +1,4 @@
+import hashlib
 from typing import Optional
 
 from isla.derivation_tree import DerivationTree
@@ -5,6 +6,7 @@ from isla.derivation_tree import DerivationTree
 from debugging_framework.oracle import OracleResult
 from debugging_framework.input import Input as TestInput
 from avicenna.features import FeatureVector
+from avicenna.tree_index import TreeIndex
 
 
 class Input(TestInput):
@@ -15,11 +17,32 @@ class Input(TestInput):
     def __init__(self, tree: DerivationTree, oracle: OracleResult = None):
         super().__init__(tree, oracle)
         self.__features: Optional[FeatureVector] = None
+        self.__tree_index: Optional[TreeIndex] = None
+        self.__stable_hash: Optional[str] = None
 
     @property
     def features(self) -> FeatureVector:
         return self.__features
 
+    @property
+    def tree_index(self) -> TreeIndex:
+        """The paths, strings and lengths of the subtrees, built on first use."""
+        if self.__tree_index is None:
+            self.__tree_index = TreeIndex(self.tree)
+        return self.__tree_index
+
+    @property
+    def stable_hash(self) -> str:
+        """
+        A hash of the derivation tree that, unlike `DerivationTree.structural_hash`,
+        is stable across interpreter runs. It is computed on first use.
+        """
+        if self.__stable_hash is None:
+            self.__stable_hash = hashlib.sha256(
+                repr(self.tree.to_parse_tree()).encode()
+            ).hexdigest()
+        return self.__stable_hash
+
     @features.setter
     def features(self, features_: FeatureVector):
         self.__features = features_
@@ -0,0 +1,125 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+import z3
+from isla import language
+from islearn.language import NonterminalPlaceholderVariable
+
+from avicenna.grammar_analysis import GrammarAnalysis
+
+logger = logging.getLogger("learner")
+
+
+class PatternFilter:
+    """
+    Drops the patterns that cannot yield a relevant instantiation before any
+    tree is matched. Each `<?NONTERMINAL>` placeholder of a quantifier has to be
+    instantiated with a nonterminal that is not excluded and is reachable from
+    the nonterminal of the enclosing scope; a placeholder used as the argument
+    of `str.to.int` additionally needs a nonterminal that derives numbers. A
+    pattern is dropped if some placeholder has no such nonterminal left.
+    """
+
+    def __init__(self, analysis: GrammarAnalysis):
+        # The nonterminals that occur strictly below each nonterminal.
+        self.reachable: Dict[str, Set[str]] = {
+            nonterminal: analysis.reachable_from(nonterminal)
+            for nonterminal in analysis.nonterminals
+        }
+        self.numeric_nonterminals = set(analysis.numeric_nonterminals)
+
+    def filter(
+        self,
+        patterns: Iterable[language.Formula],
+        exclude_nonterminals: Iterable[str] = (),
+    ) -> List[language.Formula]:
+        patterns = list(patterns)
+        exclude_nonterminals = set(exclude_nonterminals)
+        result = [
+            pattern
+            for pattern in patterns
+            if self.can_be_instantiated(pattern, exclude_nonterminals)
+        ]
+        logger.info(
+            "Dropped %d of %d patterns without relevant instantiations.",
+            len(patterns) - len(result),
+            len(patterns),
+        )
+        return result
+
+    def can_be_instantiated(
+        self, pattern: language.Formula, exclude_nonterminals: Set[str]
+    ) -> bool:
+        numeric = _str_to_int_arguments(pattern)
+        # The nonterminals each placeholder variable can still be instantiated
+        # with, by the name of the variable.
+        candidates: Dict[str, Set[str]] = {}
+
+        for formula in _quantified_formulas(pattern):
+            variable = formula.bound_variable
+            if not isinstance(variable, NonterminalPlaceholderVariable):
+                candidates[variable.name] = {variable.n_type}
+                continue
+
+            scope = _scope(formula.in_variable, candidates)
+            if scope is None:
+                continue
+            nonterminals = {
+                nonterminal
+                for in_nonterminal in scope
+                for nonterminal in self.reachable.get(in_nonterminal, set())
+                if nonterminal not in exclude_nonterminals
+            }
+            if variable.name in numeric:
+                nonterminals &= self.numeric_nonterminals
+            if not nonterminals:
+                return False
+            candidates[variable.name] = nonterminals
+        return True
+
+
+def _scope(
+    in_variable: language.Variable, candidates: Dict[str, Set[str]]
+) -> Optional[Set[str]]:
+    if isinstance(in_variable, language.Constant):
+        return {in_variable.n_type}
+    return candidates.get(in_variable.name)
+
+
+def _quantified_formulas(
+    formula: language.Formula,
+) -> Iterable[language.QuantifiedFormula]:
+    """The quantified formulas in the formula, outer ones first."""
+    if isinstance(formula, language.QuantifiedFormula):
+        yield formula
+    if hasattr(formula, "inner_formula"):
+        yield from _quantified_formulas(formula.inner_formula)
+    elif isinstance(
+        formula,
+        (
+            language.ConjunctiveFormula,
+            language.DisjunctiveFormula,
+            language.NegatedFormula,
+        ),
+    ):
+        for arg in formula.args:
+            yield from _quantified_formulas(arg)
+
+
+def _str_to_int_arguments(formula: language.Formula) -> Set[str]:
+    """The names of the variables that occur as the argument of `str.to.int`."""
+    names: Set[str] = set()
+    for smt_formula in language.FilterVisitor(
+        lambda f: isinstance(f, language.SMTFormula)
+    ).collect(formula):
+        stack = [smt_formula.formula]
+        while stack:
+            expression = stack.pop()
+            if (
+                expression.decl().kind() == z3.Z3_OP_STR_TO_INT
+                and z3.is_const(expression.arg(0))
+                and not z3.is_string_value(expression.arg(0))
+            ):
+                names.add(str(expression.arg(0)))
+            stack.extend(expression.children())
+    return names
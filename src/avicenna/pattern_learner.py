@@ -1,13 +1,27 @@
+import collections
 import copy
 import logging
 import functools
-from typing import List, Tuple, Dict, Optional, Iterable, Sequence, Set
-import itertools
+import heapq
+import math
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    List,
+    Tuple,
+    Dict,
+    Optional,
+    Iterable,
+    Sequence,
+    Set,
+    Callable,
+    Counter,
+    FrozenSet,
+)
 
 import pandas
 import numpy
-from isla.evaluator import evaluate
-from isla.language import Formula, ConjunctiveFormula
+from isla.language import Formula, ConjunctiveFormula, DisjunctiveFormula
 from islearn.learner import weighted_geometric_mean
 from grammar_graph import gg
 from isla import language
@@ -19,75 +33,453 @@ logger = logging.getLogger("learner")
 
 from debugging_framework.oracle import OracleResult
 from avicenna.input import Input
+from avicenna.evaluation_cache import EvaluationCache, evaluate_formula
+from avicenna.feature_evaluation import FeatureBound
+from avicenna.grammar_analysis import analyze
+from avicenna.pattern_filter import PatternFilter
+from avicenna.string_evaluation import StringFormula, evaluate_batch
+
+
+class InputIndex:
+    """
+    Assigns every input a dense, stable position and records its label. The
+    evaluation results of all truth table rows sharing an index are aligned to
+    these positions, which allows combining rows with vectorized boolean
+    operations and deriving precision and recall with masked reductions. Rows
+    do not keep their own input sets: which inputs a row has seen is a bitmap
+    over these positions.
+    """
+
+    def __init__(self):
+        self._positions: Dict[Input, int] = {}
+        self._inputs: List[Input] = []
+        self._failing: numpy.ndarray = numpy.zeros(0, dtype=bool)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, inp: Input):
+        return inp in self._positions
+
+    def __getitem__(self, position: int) -> Input:
+        return self._inputs[position]
+
+    def __deepcopy__(self, memodict=None):
+        index = InputIndex()
+        index._positions = dict(self._positions)
+        index._inputs = list(self._inputs)
+        index._failing = self._failing.copy()
+        return index
+
+    @property
+    def failing(self) -> numpy.ndarray:
+        """The label vector: True for failure-inducing inputs."""
+        return self._failing[: len(self)]
+
+    def position(self, inp: Input) -> int:
+        position = self._positions.get(inp)
+        if position is None:
+            position = len(self._positions)
+            self._positions[inp] = position
+            self._inputs.append(inp)
+            self._failing = _grown(self._failing, position + 1)
+            self._failing[position] = inp.oracle == OracleResult.FAILING
+        return position
+
+    def positions(self, inputs: Iterable[Input]) -> numpy.ndarray:
+        return numpy.fromiter((self.position(inp) for inp in inputs), dtype=numpy.intp)
+
+
+def _padded(vector: numpy.ndarray, size: int) -> numpy.ndarray:
+    if len(vector) >= size:
+        return vector
+    result = numpy.zeros(size, dtype=bool)
+    result[: len(vector)] = vector
+    return result
+
+
+def _grown(vector: numpy.ndarray, size: int) -> numpy.ndarray:
+    """Pads the vector to at least `size`, at least doubling its capacity."""
+    if len(vector) >= size:
+        return vector
+    return _padded(vector, max(size, 2 * len(vector)))
+
+
+def _grown_matrix(matrix: numpy.ndarray, rows: int, columns: int) -> numpy.ndarray:
+    """Pads the matrix to at least the given shape, at least doubling each
+    dimension that needs to grow."""
+    capacity_rows, capacity_columns = matrix.shape
+    if rows <= capacity_rows and columns <= capacity_columns:
+        return matrix
+    if rows > capacity_rows:
+        capacity_rows = max(rows, 2 * capacity_rows)
+    if columns > capacity_columns:
+        capacity_columns = max(columns, 2 * capacity_columns)
+    result = numpy.zeros((capacity_rows, capacity_columns), dtype=bool)
+    result[: matrix.shape[0], : matrix.shape[1]] = matrix
+    return result
+
+
+def _count(vector: numpy.ndarray, mask: numpy.ndarray) -> int:
+    size = min(len(vector), len(mask))
+    return int(numpy.count_nonzero(vector[:size] & mask[:size]))
+
+
+def _specificity_and_recall(
+    results: numpy.ndarray, evaluated: numpy.ndarray, failing: numpy.ndarray
+) -> Tuple[float, float]:
+    evaluated_failing = numpy.count_nonzero(evaluated & failing)
+    evaluated_passing = numpy.count_nonzero(evaluated & ~failing)
+    recall = (
+        numpy.count_nonzero(results & failing) / evaluated_failing
+        if evaluated_failing
+        else 0.0
+    )
+    specificity = (
+        1 - numpy.count_nonzero(results & ~failing) / evaluated_passing
+        if evaluated_passing
+        else 0.0
+    )
+    return specificity, recall
+
+
+def _pair_counts(
+    matrix: numpy.ndarray, mask: numpy.ndarray, other: Optional[numpy.ndarray] = None
+) -> numpy.ndarray:
+    """
+    The number of masked inputs each pair of rows of `matrix` (and `other`)
+    both hold for. Only the masked columns enter the product, as float32, which
+    counts exactly up to 2**24 inputs.
+    """
+    left = matrix[:, mask].astype(numpy.float32)
+    right = left if other is None else other[:, mask].astype(numpy.float32)
+    return (left @ right.T).astype(numpy.float64)
+
+
+def _conjoin(
+    results: numpy.ndarray,
+    evaluated: numpy.ndarray,
+    other_results: numpy.ndarray,
+    other_evaluated: numpy.ndarray,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Combines the result vectors of two formulas into those of their conjunction,
+    which is known wherever both are known or either is known to be false.
+    """
+    conjunction_evaluated = (
+        (evaluated & other_evaluated)
+        | (evaluated & ~results)
+        | (other_evaluated & ~other_results)
+    )
+    return results & other_results, conjunction_evaluated
+
+
+def _disjoin(
+    results: numpy.ndarray,
+    evaluated: numpy.ndarray,
+    other_results: numpy.ndarray,
+    other_evaluated: numpy.ndarray,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Combines the result vectors of two formulas into those of their disjunction,
+    which is known wherever both are known or either is known to be true.
+    """
+    disjunction_results = (results & evaluated) | (other_results & other_evaluated)
+    return disjunction_results, (evaluated & other_evaluated) | disjunction_results
+
+
+# The number of set bits of every byte.
+_BIT_COUNTS = numpy.array([bin(byte).count("1") for byte in range(256)], numpy.int64)
+
+
+def _bit_count(bitsets: numpy.ndarray) -> numpy.ndarray:
+    """The number of set bits of bitsets packed with `numpy.packbits`."""
+    return _BIT_COUNTS[bitsets].sum(axis=-1)
+
+
+def _wilson_interval(successes: int, trials: int, z: float) -> Tuple[float, float]:
+    proportion = successes / trials
+    denominator = 1 + z**2 / trials
+    center = (proportion + z**2 / (2 * trials)) / denominator
+    margin = (
+        z
+        * math.sqrt(proportion * (1 - proportion) / trials + z**2 / (4 * trials**2))
+        / denominator
+    )
+    return center - margin, center + margin
+
+
+def _is_decided(
+    false_positives: int, evaluated: int, min_specificity: float, z: float
+) -> bool:
+    """Whether the Wilson interval of the specificity excludes the threshold."""
+    lower, upper = _wilson_interval(evaluated - false_positives, evaluated, z)
+    return lower > min_specificity or upper < min_specificity
+
+
+# A precision stopping rule: the number of passing inputs, `min_specificity`, and
+# the z-score of the confidence interval (None for exact stopping only).
+StoppingRule = Tuple[int, float, Optional[float]]
+
+
+def _ratio(numerator: numpy.ndarray, denominator: numpy.ndarray) -> numpy.ndarray:
+    """Element-wise division that yields 0 where the denominator is 0."""
+    return numpy.divide(
+        numerator,
+        denominator,
+        out=numpy.zeros(numpy.shape(numerator)),
+        where=denominator > 0,
+    )
+
+
+# The grammar graph of a worker process, sent once when the worker starts.
+_worker_graph: Optional[gg.GrammarGraph] = None
+
+
+def _initialize_worker(graph: gg.GrammarGraph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _evaluate_chunk(
+    chunk: List[
+        Tuple[
+            language.Formula,
+            List[language.DerivationTree],
+            Optional[Tuple[int, StoppingRule]],
+        ]
+    ]
+) -> List[List[bool]]:
+    # Rows of a chunk share their trees, and with them the tree indices.
+    inputs: Dict[int, Input] = {}
+
+    def evaluate_tree(formula: language.Formula, tree: language.DerivationTree):
+        inp = inputs.setdefault(id(tree), Input(tree))
+        return evaluate_formula(formula, inp, _worker_graph)
+
+    return [
+        _evaluate_until_stopped(
+            functools.partial(evaluate_tree, formula), trees, stopping
+        )
+        for formula, trees, stopping in chunk
+    ]
+
+
+def _evaluate_until_stopped(
+    evaluate_one: Callable,
+    items: Sequence,
+    stopping: Optional[Tuple[int, StoppingRule]],
+) -> List[bool]:
+    """
+    Evaluates the items in order. With a stopping rule, which comes with the
+    number of false positives so far, the evaluation ends as soon as the rule
+    says the remaining items cannot change whether the formula meets the
+    threshold. The confidence interval is built from the items of this call
+    alone, so an estimate from earlier calls never keeps the formula from
+    seeing new items.
+    """
+    if stopping is None:
+        return [evaluate_one(item) for item in items]
+
+    false_positives, (number_passing, min_specificity, z) = stopping
+    new_false_positives = 0
+    eval_results = []
+    for item in items:
+        if AvicennaTruthTableRow.should_stop_evaluation(
+            false_positives, 0, number_passing, min_specificity
+        ) or (
+            z is not None
+            and eval_results
+            and _is_decided(new_false_positives, len(eval_results), min_specificity, z)
+        ):
+            break
+        eval_result = evaluate_one(item)
+        eval_results.append(eval_result)
+        false_positives += eval_result
+        new_false_positives += eval_result
+    return eval_results
 
 
 class AvicennaTruthTableRow:
     def __init__(
         self,
         formula: language.Formula,
-        inputs: Set[Input] = None,
-        eval_results: Sequence[bool] = (),
-        comb: Dict[Input, bool] = None,
+        index: Optional[InputIndex] = None,
+        results: Optional[numpy.ndarray] = None,
+        evaluated: Optional[numpy.ndarray] = None,
     ):
         self.formula = formula
-        self.inputs = inputs or set()
-        self.eval_results: List[bool] = list(eval_results)
-        self.comb: Dict[Input, bool] = comb or {}
+        self.index = index if index is not None else InputIndex()
+        # Both vectors are aligned to the positions of the input index:
+        # `evaluated` marks the inputs this row has been evaluated on, and
+        # `results` holds the evaluation result (False for unevaluated inputs).
+        # Once the row is part of a truth table, they are views into the
+        # table's evaluation matrix.
+        self.results: numpy.ndarray = (
+            results if results is not None else numpy.zeros(0, dtype=bool)
+        )
+        self.evaluated: numpy.ndarray = (
+            evaluated if evaluated is not None else numpy.zeros(0, dtype=bool)
+        )
+        self.table: Optional["AvicennaTruthTable"] = None
+        # Set if a lazy precision evaluation skipped some of the passing inputs.
+        self.stopped_early = False
+        self._formula_length: Optional[int] = None
 
     def __copy__(self):
-        return AvicennaTruthTableRow(
-            self.formula, self.inputs, self.eval_results, self.comb
+        row = AvicennaTruthTableRow(
+            self.formula,
+            self.index,
+            self.results.copy(),
+            self.evaluated.copy(),
         )
+        row.stopped_early = self.stopped_early
+        row._formula_length = self._formula_length
+        return row
+
+    @property
+    def formula_length(self) -> int:
+        """The length of the formula, which is computed only once."""
+        if self._formula_length is None:
+            self._formula_length = len(self.formula)
+        return self._formula_length
 
     def evaluate(
         self,
-        test_inputs: Set[Input],
+        test_inputs: Iterable[Input],
         graph: gg.GrammarGraph,
+        cache: Optional[EvaluationCache] = None,
+        stopping_rule: Optional[StoppingRule] = None,
     ):
-        new_inputs = test_inputs - self.inputs
+        """
+        Evaluates the row on the given inputs it has not seen yet, in order. With
+        a stopping rule, the inputs must be passing ones, and the evaluation may
+        stop before all of them are evaluated.
+        """
+        test_inputs = list(test_inputs)
+        self.evaluate_positions(
+            test_inputs,
+            self.index.positions(test_inputs),
+            graph,
+            cache,
+            stopping_rule,
+        )
 
-        for inp in new_inputs:
-            eval_result = evaluate(
-                self.formula, inp.tree, graph.grammar, graph=graph
-            ).is_true()
-            self.update_eval_results_and_combination(eval_result, inp)
+    def evaluate_positions(
+        self,
+        test_inputs: Sequence[Input],
+        positions: numpy.ndarray,
+        graph: gg.GrammarGraph,
+        cache: Optional[EvaluationCache] = None,
+        stopping_rule: Optional[StoppingRule] = None,
+    ):
+        """Like :meth:`evaluate`, with the positions of the inputs looked up."""
+        pending = self.unevaluated(positions)
+        new_inputs = [test_inputs[idx] for idx in pending]
+        if cache is None:
+            evaluate_one = functools.partial(
+                self.evaluate_formula_for_input, self.formula, graph=graph
+            )
+        else:
+            evaluate_one = functools.partial(cache.evaluate, self.formula, graph=graph)
 
-        self.inputs.update(new_inputs)
+        eval_results = _evaluate_until_stopped(
+            evaluate_one, new_inputs, self.stopping_state(stopping_rule)
+        )
+        self.record(positions[pending], eval_results)
+
+    def unevaluated(self, positions: numpy.ndarray) -> numpy.ndarray:
+        """The indices of the positions this row has not been evaluated on."""
+        self.resize(len(self.index))
+        return numpy.flatnonzero(~self.evaluated[positions])
+
+    def stopping_state(
+        self, stopping_rule: Optional[StoppingRule]
+    ) -> Optional[Tuple[int, StoppingRule]]:
+        if stopping_rule is None:
+            return None
+        passing = ~self.index.failing
+        self.resize(len(self.index))
+        evaluated = self.evaluated[: len(passing)] & passing
+        false_positives = self.results[: len(passing)] & evaluated
+        return int(numpy.count_nonzero(false_positives)), stopping_rule
+
+    def record(self, positions: numpy.ndarray, eval_results: Sequence[bool]):
+        """
+        Stores the results for the inputs at the given positions of the index.
+        If there are fewer results than positions, the evaluation was stopped
+        early.
+        """
+        recorded = positions[: len(eval_results)]
+        self.resize(len(self.index))
+        self.results[recorded] = numpy.asarray(eval_results, dtype=bool)
+        self.evaluated[recorded] = True
+        self.stopped_early = len(eval_results) < len(positions)
 
+    @staticmethod
     def should_stop_evaluation(
-        self, negative_results: int, lazy: bool, result_threshold: float
+        false_positives: int,
+        evaluated: int,
+        number_passing: int,
+        min_specificity: float,
+        z: Optional[float] = None,
     ) -> bool:
-        return lazy and negative_results > len(self.inputs) * (1 - result_threshold)
-
-    def extend_eval_results_with_false(self):
-        self.eval_results += [
-            False for _ in range(len(self.inputs) - len(self.eval_results))
-        ]
+        """
+        Whether evaluating a formula on more of the `number_passing` inputs is
+        pointless: its specificity stays below `min_specificity` even if it does
+        not hold for any of the remaining inputs, or, given a z-score, the Wilson
+        interval of the specificity lies entirely above or below the threshold.
+        """
+        if false_positives > number_passing * (1 - min_specificity):
+            return True
+        if z is None or evaluated == 0:
+            return False
+        return _is_decided(false_positives, evaluated, min_specificity, z)
 
     @staticmethod
     def evaluate_formula_for_input(
         formula: language.Formula, inp: Input, graph: gg.GrammarGraph
     ) -> bool:
-        return evaluate(formula, inp.tree, graph.grammar, graph=graph).is_true()
+        return evaluate_formula(formula, inp, graph)
+
+    def resize(self, size: int):
+        if self.table is not None:
+            self.table.reserve(inputs=size)
+        else:
+            self.results = _padded(self.results, size)
+            self.evaluated = _padded(self.evaluated, size)
+
+    @property
+    def eval_results(self) -> numpy.ndarray:
+        return self.results[self.evaluated]
 
-    def update_eval_results_and_combination(self, eval_result: bool, inp: Input):
-        self.eval_results.append(eval_result)
-        self.comb[inp] = eval_result
+    def true_count(self) -> int:
+        return int(numpy.count_nonzero(self.results))
 
     def eval_result(self) -> float:
         assert self.inputs_are_valid()
-        return sum(int(entry) for entry in self.eval_results) / len(self.eval_results)
+        return self.true_count() / len(self)
+
+    def recall(self) -> float:
+        """The share of evaluated failure-inducing inputs the formula holds for."""
+        failing = self.index.failing
+        evaluated = _count(self.evaluated, failing)
+        return _count(self.results, failing) / evaluated if evaluated else 0.0
+
+    def specificity(self) -> float:
+        """The share of evaluated passing inputs the formula does not hold for."""
+        passing = ~self.index.failing
+        evaluated = _count(self.evaluated, passing)
+        return 1 - _count(self.results, passing) / evaluated if evaluated else 0.0
 
     def inputs_are_valid(self) -> bool:
-        return 0 < len(self.inputs) == len(self.eval_results) and all(
-            isinstance(entry, bool) for entry in self.eval_results
-        )
+        return len(self) > 0
 
     def __repr__(self):
-        return f"TruthTableRow({str(self.formula)},{repr(self.eval_results)})"
+        return f"TruthTableRow({str(self.formula)},{repr(self.eval_results.tolist())})"
 
     def __str__(self):
-        return f"{self.formula.__str__()}: {', '.join(map(str, self.eval_results))}, {self.comb}"
+        return f"{self.formula.__str__()}: {', '.join(map(str, self.eval_results.tolist()))}"
 
     def __eq__(self, other):
         return (
@@ -95,57 +487,84 @@ class AvicennaTruthTableRow:
         )
 
     def __len__(self):
-        return len(self.eval_results)
+        return int(numpy.count_nonzero(self.evaluated))
 
     def __hash__(self):
         return hash(self.formula)
 
     def __neg__(self):
-        comb = {}
-        for inp in self.comb.keys():
-            comb[inp] = not self.comb[inp]
-
         return AvicennaTruthTableRow(
             -self.formula,
-            self.inputs,
-            [not eval_result for eval_result in self.eval_results],
-            comb,
+            self.index,
+            ~self.results & self.evaluated,
+            self.evaluated.copy(),
         )
 
     def __and__(self, other: "AvicennaTruthTableRow") -> "AvicennaTruthTableRow":
-        assert len(self.inputs) == len(other.inputs)
-        assert len(self.eval_results) == len(other.eval_results)
-        assert self.comb.keys() == other.comb.keys()
-
-        eval_result = []
-        comb = {}
-        for inp in self.comb.keys():
-            r = self.comb[inp] and other.comb[inp]
-            eval_result.append(r)
-            comb[inp] = r
-
-        inputs = copy.copy(self.inputs)
+        assert self.index is other.index
+        size = max(len(self.evaluated), len(other.evaluated))
+        results, evaluated = _conjoin(
+            _padded(self.results, size),
+            _padded(self.evaluated, size),
+            _padded(other.results, size),
+            _padded(other.evaluated, size),
+        )
 
         return AvicennaTruthTableRow(
-            self.formula & other.formula, inputs, eval_result, comb
+            self.formula & other.formula,
+            self.index,
+            results,
+            evaluated,
         )
 
     def __or__(self, other: "AvicennaTruthTableRow") -> "AvicennaTruthTableRow":
-        raise NotImplementedError()
+        assert self.index is other.index
+        size = max(len(self.evaluated), len(other.evaluated))
+        results, evaluated = _disjoin(
+            _padded(self.results, size),
+            _padded(self.evaluated, size),
+            _padded(other.results, size),
+            _padded(other.evaluated, size),
+        )
+
+        return AvicennaTruthTableRow(
+            self.formula | other.formula,
+            self.index,
+            results,
+            evaluated,
+        )
 
 
 class AvicennaTruthTable:
-    def __init__(self, rows: Iterable[AvicennaTruthTableRow] = ()):
-        self.row_hashes = set()
-        self.rows = []
+    """
+    A columnar store of evaluation results: one boolean matrix with a row per
+    formula and a column per input of the table's :class:`InputIndex`. Recall and
+    specificity of a row are derived from the matrix and the index's label vector.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[AvicennaTruthTableRow] = (),
+        index: Optional[InputIndex] = None,
+    ):
+        self.index = index if index is not None else InputIndex()
+        self.results = numpy.zeros((0, 0), dtype=bool)
+        self.evaluated = numpy.zeros((0, 0), dtype=bool)
+        self.rows: List[AvicennaTruthTableRow] = []
+        # Both indices are kept consistent with `self.rows`, so that looking up
+        # and removing rows by their formula does not need to scan the table.
+        self.rows_by_formula: Dict[language.Formula, AvicennaTruthTableRow] = {}
+        self.positions: Dict[language.Formula, int] = {}
         for row in rows:
-            row_hash = hash(row)
-            if row_hash not in self.row_hashes:
-                self.row_hashes.add(row_hash)
-                self.rows.append(row)
+            self.append(row)
 
     def __deepcopy__(self, memodict=None):
-        return AvicennaTruthTable([copy.copy(row) for row in self.rows])
+        table = AvicennaTruthTable(index=copy.deepcopy(self.index))
+        for row in self.rows:
+            row_copy = copy.copy(row)
+            row_copy.index = table.index
+            table.append(row_copy)
+        return table
 
     def __repr__(self):
         return f"TruthTable({repr(self.rows)})"
@@ -159,29 +578,168 @@ class AvicennaTruthTable:
 
         assert isinstance(item, language.Formula)
         try:
-            return next(row for row in self.rows if row.formula == item)
-        except StopIteration:
+            return self.rows_by_formula[item]
+        except KeyError:
             raise KeyError(item)
 
+    def __contains__(self, item: AvicennaTruthTableRow | language.Formula) -> bool:
+        if isinstance(item, AvicennaTruthTableRow):
+            item = item.formula
+        return item in self.rows_by_formula
+
     def __len__(self):
         return len(self.rows)
 
     def __iter__(self):
         return iter(self.rows)
 
+    def position(self, formula: language.Formula) -> int:
+        return self.positions[formula]
+
+    def reserve(self, rows: int = 0, inputs: int = 0):
+        """Grows the evaluation matrix to hold at least the given number of rows
+        and inputs, and rebinds the rows to the reallocated matrix."""
+        capacity_rows, capacity_inputs = self.results.shape
+        if rows <= capacity_rows and inputs <= capacity_inputs:
+            return
+
+        self.results = _grown_matrix(self.results, rows, inputs)
+        self.evaluated = _grown_matrix(self.evaluated, rows, inputs)
+        for position, row in enumerate(self.rows):
+            self._bind(row, position)
+
+    def _bind(self, row: AvicennaTruthTableRow, position: int):
+        row.table = self
+        row.results = self.results[position]
+        row.evaluated = self.evaluated[position]
+
     def append(self, row: AvicennaTruthTableRow):
-        row_hash = hash(row)
-        if row_hash not in self.row_hashes:
-            self.row_hashes.add(row_hash)
-            self.rows.append(row)
+        if row.formula in self.rows_by_formula:
+            return
+
+        if row.index is not self.index:
+            row = self._realigned(row)
+        elif row.table is not None:
+            row = copy.copy(row)
+
+        position = len(self.rows)
+        self.reserve(rows=position + 1, inputs=len(row.results))
+        self.results[position, : len(row.results)] = row.results
+        self.evaluated[position, : len(row.evaluated)] = row.evaluated
+        self._bind(row, position)
+
+        self.rows_by_formula[row.formula] = row
+        self.positions[row.formula] = position
+        self.rows.append(row)
+
+    def _realigned(self, row: AvicennaTruthTableRow) -> AvicennaTruthTableRow:
+        """
+        A copy of a row of another input index, with its results moved to the
+        positions of the same inputs in the index of this table.
+        """
+        evaluated = numpy.flatnonzero(row.evaluated[: len(row.index)])
+        positions = self.index.positions(row.index[position] for position in evaluated)
+        results = numpy.zeros(len(self.index), dtype=bool)
+        results[positions] = row.results[evaluated]
+        evaluated_positions = numpy.zeros(len(self.index), dtype=bool)
+        evaluated_positions[positions] = True
+        realigned = AvicennaTruthTableRow(
+            row.formula, self.index, results, evaluated_positions
+        )
+        realigned.stopped_early = row.stopped_early
+        realigned._formula_length = row._formula_length
+        return realigned
 
     def remove(self, row: AvicennaTruthTableRow):
-        if hash(row) in self.row_hashes:
-            self.rows.remove(row)
-            self.row_hashes.remove(hash(row))
+        """
+        Removes the row in constant time. The last row of the table takes the
+        position of the removed row.
+        """
+        position = self.positions.pop(row.formula, None)
+        if position is None:
+            return
+
+        removed_row = self.rows_by_formula.pop(row.formula)
+        removed_row.table = None
+        removed_row.results = removed_row.results.copy()
+        removed_row.evaluated = removed_row.evaluated.copy()
+
+        last_row = self.rows.pop()
+        last_position = len(self.rows)
+        if position < last_position:
+            self.results[position] = self.results[last_position]
+            self.evaluated[position] = self.evaluated[last_position]
+            self.rows[position] = last_row
+            self.positions[last_row.formula] = position
+            self._bind(last_row, position)
+        self.results[last_position] = False
+        self.evaluated[last_position] = False
+
+    def scores(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Computes the specificity and the recall of all rows in a single pass over
+        the evaluation matrix. Both vectors are in row order.
+        """
+        number_inputs = len(self.index)
+        results = self.results[: len(self.rows), :number_inputs]
+        evaluated = self.evaluated[: len(self.rows), :number_inputs]
+        failing = self.index.failing
+        passing = ~failing
+
+        recall = _ratio(
+            numpy.count_nonzero(results & failing, axis=1),
+            numpy.count_nonzero(evaluated & failing, axis=1),
+        )
+        evaluated_passing = numpy.count_nonzero(evaluated & passing, axis=1)
+        specificity = numpy.where(
+            evaluated_passing > 0,
+            1
+            - _ratio(numpy.count_nonzero(results & passing, axis=1), evaluated_passing),
+            0.0,
+        )
+        return specificity, recall
+
+    def ranking(
+        self,
+        min_specificity: float = 0.0,
+        min_recall: float = 0.0,
+        k: Optional[int] = None,
+    ) -> List[Tuple[language.Formula, float, float]]:
+        """
+        The rows that meet both thresholds as (formula, specificity, recall),
+        best first: by specificity, then recall, then shorter formulas. With `k`,
+        only the best `k` rows are kept in a bounded heap, which is the same as
+        cutting off the full ranking after `k` rows.
+        """
+        specificity, recall = self.scores()
+        qualifying = numpy.flatnonzero(
+            (specificity >= min_specificity) & (recall >= min_recall)
+        )
+
+        def key(position: int) -> Tuple[float, float, int]:
+            return (
+                specificity[position],
+                recall[position],
+                -self.rows[position].formula_length,
+            )
+
+        if k is None:
+            positions = sorted(qualifying, key=key, reverse=True)
+        else:
+            positions = heapq.nlargest(k, qualifying, key=key)
+        return [
+            (
+                self.rows[position].formula,
+                float(specificity[position]),
+                float(recall[position]),
+            )
+            for position in positions
+        ]
 
     def __add__(self, other: "AvicennaTruthTable") -> "AvicennaTruthTable":
-        return AvicennaTruthTable(self.rows + other.rows)
+        result = copy.deepcopy(self)
+        result += other
+        return result
 
     def __iadd__(self, other: "AvicennaTruthTable") -> "AvicennaTruthTable":
         for row in other.rows:
@@ -202,12 +760,15 @@ class PatternLearner:
     def learn_failure_invariants(
         self,
         test_inputs: Set[Input],
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
+        truth_table: AvicennaTruthTable,
         exclude_nonterminals: Optional[Iterable[str]] = None,
     ):
         raise NotImplementedError()
 
+    def close(self):
+        """Releases resources held across calls, such as worker processes."""
+        pass
+
 
 class AviIslearn(InvariantLearner, PatternLearner):
     def __init__(
@@ -217,6 +778,12 @@ class AviIslearn(InvariantLearner, PatternLearner):
         patterns: Optional[List[Formula]] = None,
         activated_patterns: Optional[Iterable[str]] = None,
         deactivated_patterns: Optional[Iterable[str]] = None,
+        processes: Optional[int] = None,
+        evaluation_cache: Optional[EvaluationCache] = None,
+        lazy_precision: bool = False,
+        precision_confidence: Optional[float] = None,
+        max_results: Optional[int] = None,
+        max_disjunction_size: int = 1,
     ):
         super().__init__(
             grammar,
@@ -224,11 +791,38 @@ class AviIslearn(InvariantLearner, PatternLearner):
             pattern_file=pattern_file,
             activated_patterns=activated_patterns,
             deactivated_patterns=deactivated_patterns,
+            max_disjunction_size=max_disjunction_size,
         )
         self.all_negative_inputs: Set[Input] = set()
         self.all_positive_inputs: Set[Input] = set()
         self.initialize_attributes(grammar)
 
+        # The pattern instantiations for each positive tree seen so far, by the
+        # tree's structural hash. They hold for the excluded nonterminals they
+        # were computed with and are dropped when the exclusions change.
+        self.instantiations: Dict[int, Set[Formula]] = {}
+        self.instantiation_exclusions: FrozenSet[str] = frozenset()
+        self.k_paths: Dict[Input, FrozenSet[Tuple[gg.Node, ...]]] = {}
+
+        # Formulas are evaluated in this many worker processes; the pool is
+        # started on first use and kept until `close` is called.
+        self.processes = processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.evaluation_cache = evaluation_cache
+
+        # In lazy mode, a row's precision evaluation stops as soon as the row
+        # provably misses `min_specificity`, or, given a confidence level, once
+        # the confidence interval of its specificity excludes the threshold.
+        self.lazy_precision = lazy_precision
+        self.precision_z: Optional[float] = (
+            statistics.NormalDist().inv_cdf(1 - (1 - precision_confidence) / 2)
+            if precision_confidence is not None
+            else None
+        )
+
+        # If set, only this many of the best invariants are returned.
+        self.max_results = max_results
+
         not_patterns = []
         for pattern in self.patterns:
             not_patterns.append(-pattern)
@@ -239,20 +833,23 @@ class AviIslearn(InvariantLearner, PatternLearner):
         self.graph = gg.GrammarGraph.from_grammar(grammar)
         self.exclude_nonterminals: Set[str] = set()
         self.positive_examples_for_learning: List[language.DerivationTree] = []
+        self.analysis = analyze(grammar)
+        self.numeric_nonterminals: Set[str] = set(self.analysis.numeric_nonterminals)
+        self.pattern_filter = PatternFilter(self.analysis)
+        self.feature_bounds: Dict[Formula, Optional[FeatureBound]] = {}
+        # The number of input evaluations per fast path and by the evaluator.
+        self.evaluation_counts: Counter[str] = collections.Counter()
 
     def learn_failure_invariants(
         self,
         test_inputs: Set[Input],
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
+        truth_table: AvicennaTruthTable,
         exclude_nonterminals: Optional[Iterable[str]] = None,
     ):
         positive_inputs, negative_inputs = self.categorize_inputs(test_inputs)
         self.update_inputs(positive_inputs, negative_inputs)
         self.exclude_nonterminals = exclude_nonterminals or set()
-        return self._learn_invariants(
-            positive_inputs, negative_inputs, precision_truth_table, recall_truth_table
-        )
+        return self._learn_invariants(positive_inputs, negative_inputs, truth_table)
 
     @staticmethod
     def categorize_inputs(test_inputs: Set[Input]) -> Tuple[Set[Input], Set[Input]]:
@@ -272,38 +869,59 @@ class AviIslearn(InvariantLearner, PatternLearner):
         self,
         positive_inputs: Set[Input],
         negative_inputs: Set[Input],
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
+        truth_table: AvicennaTruthTable,
     ) -> List[Tuple[Formula, float, float]]:
         sorted_positive_inputs = self.sort_and_filter_inputs(self.all_positive_inputs)
         candidates = self.get_candidates(sorted_positive_inputs)
 
-        self.evaluate_recall(candidates, recall_truth_table, positive_inputs)
-        self.filter_candidates(precision_truth_table, recall_truth_table)
-        self.evaluate_precision(
-            precision_truth_table, recall_truth_table, negative_inputs
-        )
+        self.evaluate_recall(candidates, truth_table, positive_inputs)
+        self.filter_candidates(truth_table)
+        self.evaluate_precision(truth_table, negative_inputs)
 
-        self.get_disjunctions()
-        self.get_conjunctions(precision_truth_table, recall_truth_table)
+        self.get_disjunctions(truth_table)
+        self.get_conjunctions(truth_table)
 
-        result = self.get_result_list(precision_truth_table, recall_truth_table)
-        return result  # , precision_truth_table, recall_truth_table
+        result = self.get_result_list(truth_table)
+        return result
 
     @staticmethod
-    def clean_up_tables(candidates, precision_truth_table, recall_truth_table):
-        rows_to_remove = [
-            row for row in recall_truth_table if row.formula not in candidates
-        ]
+    def clean_up_tables(candidates, truth_table: AvicennaTruthTable):
+        rows_to_remove = [row for row in truth_table if row.formula not in candidates]
         for row in rows_to_remove:
-            recall_truth_table.remove(row)
-            precision_truth_table.remove(row)
+            truth_table.remove(row)
 
-    def get_candidates(self, sorted_positive_inputs):
-        candidates = self.generate_candidates(
-            self.patterns, [inp.tree for inp in sorted_positive_inputs]
+    def get_candidates(self, sorted_positive_inputs) -> Set[Formula]:
+        """
+        The union of the pattern instantiations of the given inputs. Patterns
+        without relevant instantiations under the current exclusions are
+        dropped beforehand. The instantiations of each tree are memoized as
+        long as the exclusions stay the same, so only trees that are new to the
+        selection are processed; a candidate is kept if it is an instantiation
+        for at least one of the trees.
+        """
+        exclusions = frozenset(self.exclude_nonterminals)
+        if exclusions != self.instantiation_exclusions:
+            self.instantiations.clear()
+            self.instantiation_exclusions = exclusions
+
+        patterns = self.pattern_filter.filter(self.patterns, exclusions)
+        candidates: Set[Formula] = set()
+        new_trees = 0
+        for inp in sorted_positive_inputs:
+            key = inp.tree.structural_hash()
+            if key not in self.instantiations:
+                self.instantiations[key] = self.generate_candidates(
+                    patterns, [inp.tree]
+                )
+                new_trees += 1
+            candidates.update(self.instantiations[key])
+        logger.info(
+            "Found %d invariant candidates (instantiated patterns for %d new "
+            "of %d inputs).",
+            len(candidates),
+            new_trees,
+            len(sorted_positive_inputs),
         )
-        logger.info("Found %d invariant candidates.", len(candidates))
         return candidates
 
     def sort_and_filter_inputs(
@@ -311,9 +929,8 @@ class AviIslearn(InvariantLearner, PatternLearner):
         positive_inputs: Set[Input],
         max_number_positive_inputs_for_learning: int = 10,
     ):
-        p_dummy = copy.deepcopy(positive_inputs)
         sorted_positive_inputs = self._sort_inputs(
-            p_dummy,
+            positive_inputs,
             self.filter_inputs_for_learning_by_kpaths,
             more_paths_weight=1.7,
             smaller_inputs_weight=1.0,
@@ -326,170 +943,566 @@ class AviIslearn(InvariantLearner, PatternLearner):
         return sorted_positive_inputs[:max_number_positive_inputs_for_learning]
 
     def evaluate_recall(
-        self, candidates, recall_truth_table: AvicennaTruthTable, positive_inputs
+        self, candidates, truth_table: AvicennaTruthTable, positive_inputs
     ):
         logger.info("Evaluating Recall.")
-        for candidate in candidates.union(
-            set([row.formula for row in recall_truth_table])
-        ):
-            if (
-                len(recall_truth_table) > 0
-                and AvicennaTruthTableRow(candidate) in recall_truth_table
-            ):
-                recall_truth_table[candidate].evaluate(positive_inputs, self.graph)
+        work = []
+        for candidate in candidates.union(set([row.formula for row in truth_table])):
+            if candidate in truth_table:
+                work.append((truth_table[candidate], positive_inputs))
             else:
-                new_row = AvicennaTruthTableRow(candidate)
-                new_row.evaluate(self.all_positive_inputs, self.graph)
-                recall_truth_table.append(new_row)
+                new_row = AvicennaTruthTableRow(candidate, truth_table.index)
+                truth_table.append(new_row)
+                work.append((new_row, self.all_positive_inputs))
+        self.evaluate_rows(work)
 
-    def filter_candidates(
-        self,
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-    ):
+    def filter_candidates(self, truth_table: AvicennaTruthTable):
         # Deleting throws away all calculated evals so far == bad -> maybe only pass TruthTableRows >= self.min_recall?
+        # Combinations are searched anew in every iteration. Rows that miss the
+        # recall threshold are kept as long as they may become disjuncts.
+        _, recall = truth_table.scores()
         rows_to_remove = [
             row
-            for row in recall_truth_table
-            if row.eval_result() < self.min_recall
-            or isinstance(row.formula, ConjunctiveFormula)
+            for row, recall_value in zip(truth_table, recall)
+            if (recall_value < self.min_recall and self.max_disjunction_size < 2)
+            or isinstance(row.formula, (ConjunctiveFormula, DisjunctiveFormula))
         ]
-        if self.max_disjunction_size < 2:
-            for row in rows_to_remove:
-                recall_truth_table.remove(row)
-                precision_truth_table.remove(row)
+        for row in rows_to_remove:
+            truth_table.remove(row)
 
     def evaluate_precision(
         self,
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-        negative_inputs,
+        truth_table: AvicennaTruthTable,
+        negative_inputs: Optional[Set[Input]] = None,
     ):
         logger.info("Evaluating Precision.")
-        for row in recall_truth_table:
-            if len(recall_truth_table) > 0 and row in precision_truth_table:
-                precision_truth_table[row.formula].evaluate(negative_inputs, self.graph)
-            else:
-                # print("Complete Eval Precision")
-                new_row = AvicennaTruthTableRow(row.formula)
-                new_row.evaluate(self.all_negative_inputs, self.graph)
-                precision_truth_table.append(new_row)
+        # Rows added during this iteration have not seen any passing input yet.
+        if not self.lazy_precision:
+            self.evaluate_rows([(row, self.all_negative_inputs) for row in truth_table])
+            return
 
-        assert len(precision_truth_table) == len(recall_truth_table)
+        # The inputs of this iteration were generated to challenge the current
+        # candidates, so they are the most likely to end an evaluation early.
+        negative_inputs = negative_inputs or set()
+        ordered_inputs = list(negative_inputs) + list(
+            self.all_negative_inputs - negative_inputs
+        )
+        stopping_rule = (
+            len(self.all_negative_inputs),
+            self.min_specificity,
+            self.precision_z,
+        )
+        self.evaluate_rows(
+            [(row, ordered_inputs) for row in truth_table], stopping_rule
+        )
+        logger.info(
+            "Stopped the precision evaluation of %d of %d candidates early.",
+            sum(row.stopped_early for row in truth_table),
+            len(truth_table),
+        )
 
-    def get_result_list(
-        self, precision_truth_table, recall_truth_table
-    ) -> List[Tuple[Formula, float, float]]:
-        def meets_criteria(precision_value_, recall_value_):
-            return (
-                precision_value_ >= self.min_specificity
-                and recall_value_ >= self.min_recall
+    def evaluate_rows(
+        self,
+        work: List[Tuple[AvicennaTruthTableRow, Iterable[Input]]],
+        stopping_rule: Optional[StoppingRule] = None,
+    ):
+        """
+        Evaluates each row on the inputs paired with it. Numeric and length
+        bounds are answered from the feature vectors, string predicates by
+        comparing the strings of the subtrees; all other rows go through the
+        ISLa evaluator. With more than one process, these are split into
+        contiguous chunks that are evaluated by the worker pool; the results are
+        recorded in the order of `work`, so the outcome does not depend on which
+        worker finishes first.
+        """
+        # Rows usually share their input collections; look each up only once.
+        lookups: Dict[int, Tuple[List[Input], numpy.ndarray]] = {}
+        for row, test_inputs in work:
+            if id(test_inputs) not in lookups:
+                inputs = list(test_inputs)
+                lookups[id(test_inputs)] = inputs, row.index.positions(inputs)
+
+        counts: Counter[str] = collections.Counter()
+        work = self.evaluate_from_features(work, lookups, counts)
+        work = self.evaluate_string_formulas(work, lookups, counts)
+
+        evaluated = sum(int(numpy.count_nonzero(row.evaluated)) for row, _ in work)
+        if not self.processes or self.processes < 2:
+            for row, test_inputs in work:
+                row.evaluate_positions(
+                    *lookups[id(test_inputs)],
+                    self.graph,
+                    self.evaluation_cache,
+                    stopping_rule,
+                )
+        else:
+            self.evaluate_in_pool(work, lookups, stopping_rule)
+        if self.evaluation_cache is not None:
+            self.evaluation_cache.flush()
+        counts["evaluator"] = (
+            sum(int(numpy.count_nonzero(row.evaluated)) for row, _ in work) - evaluated
+        )
+
+        self.evaluation_counts.update(counts)
+        logger.info(
+            "Evaluated %d inputs from the feature vectors, %d by string "
+            "comparison, and %d with the ISLa evaluator.",
+            counts["features"],
+            counts["strings"],
+            counts["evaluator"],
+        )
+
+    def evaluate_in_pool(
+        self,
+        work: List[Tuple[AvicennaTruthTableRow, Iterable[Input]]],
+        lookups: Dict[int, Tuple[List[Input], numpy.ndarray]],
+        stopping_rule: Optional[StoppingRule] = None,
+    ):
+        cache = self.evaluation_cache
+        tasks = []
+        for row, test_inputs in work:
+            inputs, positions = lookups[id(test_inputs)]
+            pending = row.unevaluated(positions)
+            new_inputs = [inputs[idx] for idx in pending]
+            new_positions = positions[pending]
+            if cache is not None:
+                cached = [cache.get(row.formula, inp) for inp in new_inputs]
+                known = numpy.array([result is not None for result in cached], bool)
+                row.record(
+                    new_positions[known],
+                    [result for result in cached if result is not None],
+                )
+                new_inputs = [
+                    inp for inp, result in zip(new_inputs, cached) if result is None
+                ]
+                new_positions = new_positions[~known]
+            if new_inputs:
+                tasks.append((row, new_inputs, new_positions))
+        # Trees shared by several rows of a chunk are pickled only once.
+        chunk_size = math.ceil(len(tasks) / (self.processes * 4)) or 1
+        chunks = [
+            [
+                (
+                    row.formula,
+                    [inp.tree for inp in new_inputs],
+                    row.stopping_state(stopping_rule),
+                )
+                for row, new_inputs, _ in tasks[i : i + chunk_size]
+            ]
+            for i in range(0, len(tasks), chunk_size)
+        ]
+
+        results = [
+            eval_results
+            for chunk_results in self.pool.map(_evaluate_chunk, chunks)
+            for eval_results in chunk_results
+        ]
+        for (row, new_inputs, new_positions), eval_results in zip(tasks, results):
+            row.record(new_positions, eval_results)
+            if cache is not None:
+                for inp, eval_result in zip(new_inputs, eval_results):
+                    cache.put(row.formula, inp, eval_result)
+
+    def evaluate_from_features(
+        self,
+        work: List[Tuple[AvicennaTruthTableRow, Iterable[Input]]],
+        lookups: Dict[int, Tuple[List[Input], numpy.ndarray]],
+        counts: Counter[str],
+    ) -> List[Tuple[AvicennaTruthTableRow, Iterable[Input]]]:
+        """
+        Answers the rows whose formula is a numeric or length bound from the
+        feature vectors of their inputs, and returns the rows that have to be
+        evaluated on the derivation trees.
+        """
+        remaining = []
+        for row, test_inputs in work:
+            if row.formula not in self.feature_bounds:
+                self.feature_bounds[row.formula] = FeatureBound.from_formula(
+                    row.formula, self.numeric_nonterminals
+                )
+            bound = self.feature_bounds[row.formula]
+            inputs, positions = lookups[id(test_inputs)]
+            pending = row.unevaluated(positions)
+            eval_results = (
+                bound.evaluate([inputs[idx] for idx in pending])
+                if bound is not None
+                else None
             )
+            if eval_results is None:
+                remaining.append((row, test_inputs))
+                continue
+            row.record(positions[pending], eval_results)
+            counts["features"] += len(eval_results)
+        return remaining
 
-        result = []
-        for idx, precision_row in enumerate(precision_truth_table):
-            precision_value = 1 - precision_row.eval_result()
-            recall_value = recall_truth_table[idx].eval_result()
+    def evaluate_string_formulas(
+        self,
+        work: List[Tuple[AvicennaTruthTableRow, Iterable[Input]]],
+        lookups: Dict[int, Tuple[List[Input], numpy.ndarray]],
+        counts: Counter[str],
+    ) -> List[Tuple[AvicennaTruthTableRow, Iterable[Input]]]:
+        """
+        Evaluates the rows whose formula is a :class:`StringFormula` formula-major
+        with :func:`evaluate_batch`, and returns the rows that have to be
+        evaluated by the ISLa evaluator. String comparisons are cheap, so these
+        rows are evaluated on all their pending inputs, even with a stopping
+        rule.
+        """
+        remaining = []
+        batches: Dict[int, List[AvicennaTruthTableRow]] = {}
+        for row, test_inputs in work:
+            if StringFormula.from_formula(row.formula) is None:
+                remaining.append((row, test_inputs))
+            else:
+                batches.setdefault(id(test_inputs), []).append(row)
+
+        for inputs_id, rows in batches.items():
+            inputs, positions = lookups[inputs_id]
+            pending = [row.unevaluated(positions) for row in rows]
+            batch = numpy.unique(numpy.concatenate(pending))
+            columns = numpy.zeros(len(inputs), dtype=int)
+            columns[batch] = numpy.arange(len(batch))
+            results = evaluate_batch(
+                [row.formula for row in rows],
+                [inputs[idx] for idx in batch],
+                self.graph,
+            )
+            for row, row_results, row_pending in zip(rows, results, pending):
+                row.record(positions[row_pending], row_results[columns[row_pending]])
+                counts["strings"] += len(row_pending)
+        return remaining
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_initialize_worker,
+                initargs=(self.graph,),
+            )
+        return self._pool
 
-            if meets_criteria(precision_value, recall_value):
-                result.append((precision_row.formula, precision_value, recall_value))
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
-        result.sort(key=lambda x: (x[1], x[2], -len(x[0])), reverse=True)
+    def get_result_list(
+        self, truth_table: AvicennaTruthTable
+    ) -> List[Tuple[Formula, float, float]]:
+        result = truth_table.ranking(
+            self.min_specificity, self.min_recall, self.max_results
+        )
 
         logger.info(
-            "Found %d invariants with precision >= %d%% and recall >= %d%%.",
-            len(
-                result
-            ),  # if p[0] >= self.min_specificity and p[1] >= self.min_recall]),
+            "Kept %d invariants with precision >= %d%% and recall >= %d%%.",
+            len(result),
             int(self.min_specificity * 100),
             int(self.min_recall * 100),
         )
         return result
 
-    def get_disjunctions(self):
-        pass
+    def get_disjunctions(self, truth_table: AvicennaTruthTable):
+        """
+        Searches disjunctions of up to `max_disjunction_size` rows that reach
+        `min_recall` together while keeping `min_specificity`, and adds them to
+        the truth table. The search works on the results packed into bitsets per
+        label: a disjunction holds for the union of its members' failing inputs
+        and has the union of their false positives. Starting from each row that
+        is specific enough but misses the recall threshold, the row covering the
+        most failing inputs not covered yet is added, as long as the false
+        positives stay within the specificity bound; rows that cover nothing new
+        are never tried.
+        """
+        self.evaluated_disjunctions = 0
+        if self.max_disjunction_size < 2:
+            return
 
-    def get_conjunctions(
-        self,
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-    ):
-        logger.info("Calculating Boolean Combinations.")
-        for level in range(2, self.max_conjunction_size + 1):
-            self.process_conjunction_level(
-                level, precision_truth_table, recall_truth_table
-            )
+        logger.info("Calculating Disjunctions.")
+        table_specificity, table_recall = truth_table.scores()
+        positions = [
+            position
+            for position, row in enumerate(truth_table)
+            if not isinstance(row.formula, (ConjunctiveFormula, DisjunctiveFormula))
+            and table_specificity[position] >= self.min_specificity
+        ]
+        if len(positions) < 2:
+            return
+        rows = [truth_table[position] for position in positions]
+        number_inputs = len(truth_table.index)
+        results = truth_table.results[positions, :number_inputs]
+        evaluated = truth_table.evaluated[positions, :number_inputs]
+        failing = truth_table.index.failing
+
+        def packed(matrix: numpy.ndarray, mask: numpy.ndarray) -> numpy.ndarray:
+            return numpy.packbits(matrix[:, mask], axis=1)
+
+        true_failing = packed(results, failing)
+        known_failing = packed(evaluated, failing)
+        true_passing = packed(results, ~failing)
+        known_passing = packed(evaluated, ~failing)
+
+        disjunctions: Set[Tuple[int, ...]] = set()
+        for seed in range(len(rows)):
+            if table_recall[positions[seed]] >= self.min_recall:
+                continue
 
-    def process_conjunction_level(
-        self,
-        level: int,
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-    ):
-        combinations = self.get_combinations_of_truth_table_rows(
-            level, precision_truth_table
+            members = [seed]
+            covered, known = true_failing[seed], known_failing[seed]
+            false_positives = true_passing[seed]
+            known_passing_inputs = known_passing[seed]
+            while len(members) < self.max_disjunction_size:
+                new_covered = true_failing | covered
+                new_false_positives = true_passing | false_positives
+                new_known_passing = (
+                    known_passing & known_passing_inputs
+                ) | new_false_positives
+                gain = _bit_count(new_covered) - _bit_count(covered)
+                evaluated_passing = _bit_count(new_known_passing)
+                specificity = numpy.where(
+                    evaluated_passing > 0,
+                    1 - _ratio(_bit_count(new_false_positives), evaluated_passing),
+                    0.0,
+                )
+                eligible = (gain > 0) & (specificity >= self.min_specificity)
+                eligible[members] = False
+                self.evaluated_disjunctions += len(rows) - len(members)
+                if not numpy.any(eligible):
+                    break
+
+                member = int(numpy.argmax(numpy.where(eligible, gain, -1)))
+                members.append(member)
+                covered = new_covered[member]
+                known = (known_failing[member] & known) | covered
+                false_positives = new_false_positives[member]
+                known_passing_inputs = new_known_passing[member]
+
+                if _ratio(_bit_count(covered), _bit_count(known)) >= self.min_recall:
+                    disjunction = tuple(sorted(members))
+                    if disjunction not in disjunctions:
+                        disjunctions.add(disjunction)
+                        truth_table.append(
+                            self.get_disjunction([rows[idx] for idx in disjunction])
+                        )
+                    break
+
+        logger.info(
+            "Evaluated %d disjunction candidates, found %d disjunctions.",
+            self.evaluated_disjunctions,
+            len(disjunctions),
         )
 
-        for rows_with_indices in combinations:
-            self.process_combination(
-                rows_with_indices, precision_truth_table, recall_truth_table
+    def get_conjunctions(self, truth_table: AvicennaTruthTable):
+        """
+        Searches conjunctions of up to `max_conjunction_size` rows and adds the
+        valid ones to the truth table. All pairs are scored at once with matrix
+        products; larger combinations are searched depth-first from the pairs.
+        A conjunction's recall can never exceed the recall of its weakest member,
+        so a combination falling below `min_recall` is not expanded any further.
+        Rows that are already perfectly specific are left out, as no conjunction
+        could improve on their precision.
+
+        With lazy precision, a conjunction is unknown on the passing inputs that
+        an early-stopped member skipped, unless another member is false there.
+        Before such a conjunction is scored, its stopped members are evaluated on
+        the remaining passing inputs, unless even counting all unknown inputs as
+        true negatives leaves it below `min_specificity`.
+        """
+        logger.info("Calculating Boolean Combinations.")
+        self.evaluated_conjunctions = 0
+        self.pruned_conjunctions = 0
+
+        table_specificity, _ = truth_table.scores()
+        base_rows = [
+            row
+            for row in truth_table
+            if not isinstance(row.formula, (ConjunctiveFormula, DisjunctiveFormula))
+        ]
+        rows = [
+            row
+            for row in base_rows
+            if table_specificity[truth_table.position(row.formula)] < 1
+        ]
+        self.pruned_conjunctions += self._number_of_combinations(
+            len(base_rows), 0
+        ) - self._number_of_combinations(len(rows), 0)
+
+        positions = [truth_table.position(row.formula) for row in rows]
+        specificity = table_specificity[positions]
+        number_inputs = len(truth_table.index)
+        results = truth_table.results[positions, :number_inputs]
+        evaluated = truth_table.evaluated[positions, :number_inputs]
+        failing = truth_table.index.failing
+        number_passing = int(numpy.count_nonzero(~failing))
+        # The rows whose precision evaluation has been finished during the search.
+        completed: Set[int] = set()
+
+        def complete(members: Iterable[int]):
+            stopped = [idx for idx in members if rows[idx].stopped_early]
+            if not stopped:
+                return
+            self.evaluate_rows(
+                [(rows[idx], self.all_negative_inputs) for idx in stopped]
             )
+            for idx in stopped:
+                results[idx] = rows[idx].results[:number_inputs]
+                evaluated[idx] = rows[idx].evaluated[:number_inputs]
+                specificity[idx] = rows[idx].specificity()
+            completed.update(stopped)
+
+        def may_meet_specificity(false_positives) -> numpy.ndarray:
+            return 1 - _ratio(false_positives, number_passing) >= self.min_specificity
+
+        def expand(
+            members: List[int],
+            conjunction_results: numpy.ndarray,
+            conjunction_evaluated: numpy.ndarray,
+            best_member_specificity: float,
+        ):
+            for idx in range(members[-1] + 1, len(rows)):
+                new_results, new_evaluated = _conjoin(
+                    conjunction_results,
+                    conjunction_evaluated,
+                    results[idx],
+                    evaluated[idx],
+                )
+                new_specificity, new_recall = _specificity_and_recall(
+                    new_results, new_evaluated, failing
+                )
+                self.evaluated_conjunctions += 1
 
-    @staticmethod
-    def get_combinations_of_truth_table_rows(
-        level: int, truth_table: AvicennaTruthTable
-    ):
-        return itertools.combinations(enumerate(truth_table), level)
+                if new_recall < self.min_recall:
+                    self.pruned_conjunctions += self._number_of_combinations(
+                        len(rows) - idx - 1, len(members) + 1
+                    )
+                    continue
+
+                combination = members + [idx]
+                if self.lazy_precision and may_meet_specificity(
+                    _count(new_results, ~failing)
+                ):
+                    complete(combination)
+                    if completed.intersection(combination):
+                        # The vectors of the combination were built from
+                        # members that have been evaluated further since.
+                        new_results, new_evaluated = (
+                            results[combination[0]],
+                            evaluated[combination[0]],
+                        )
+                        for member in combination[1:]:
+                            new_results, new_evaluated = _conjoin(
+                                new_results,
+                                new_evaluated,
+                                results[member],
+                                evaluated[member],
+                            )
+                        new_specificity, new_recall = _specificity_and_recall(
+                            new_results, new_evaluated, failing
+                        )
+                        best_member_specificity = max(
+                            specificity[member] for member in members
+                        )
+                member_specificity = max(best_member_specificity, specificity[idx])
+                if (
+                    new_specificity >= self.min_specificity
+                    and new_specificity > member_specificity
+                ):
+                    truth_table.append(
+                        self.get_conjunction([rows[member] for member in combination])
+                    )
 
-    def process_combination(
-        self,
-        rows_with_indices,
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-    ):
-        precision_table_rows = [row for (_, row) in rows_with_indices]
+                if len(combination) < self.max_conjunction_size:
+                    expand(combination, new_results, new_evaluated, member_specificity)
 
-        if not self.rows_meet_minimum_recall(rows_with_indices, recall_truth_table):
+        if self.max_conjunction_size < 2 or len(rows) < 2:
             return
 
-        self.add_conjunction_to_truth_table(
-            precision_table_rows,
-            precision_truth_table,
-            recall_truth_table,
-            rows_with_indices,
+        pair_specificity, pair_recall = self._score_pairs(results, evaluated, failing)
+        upper_triangle = numpy.triu(numpy.ones((len(rows), len(rows)), dtype=bool), 1)
+        meets_recall = upper_triangle & (pair_recall >= self.min_recall)
+        self.evaluated_conjunctions += int(numpy.count_nonzero(upper_triangle))
+
+        # A pruned pair (i, j) takes all its extensions by rows after j with it.
+        extensions = numpy.array(
+            [
+                self._number_of_combinations(len(rows) - j - 1, 2)
+                for j in range(len(rows))
+            ]
         )
-
-    def rows_meet_minimum_recall(
-        self, rows_with_indices, recall_truth_table: AvicennaTruthTable
-    ) -> bool:
-        return any(
-            recall_truth_table[idx].eval_result() >= self.min_recall
-            for idx, _ in rows_with_indices
+        _, pruned_columns = numpy.nonzero(upper_triangle & ~meets_recall)
+        self.pruned_conjunctions += int(extensions[pruned_columns].sum())
+
+        stopped = numpy.array([row.stopped_early for row in rows])
+        if self.lazy_precision and numpy.any(stopped):
+            uncertain = (
+                meets_recall
+                & (stopped[:, None] | stopped[None, :])
+                & may_meet_specificity(_pair_counts(results, ~failing))
+            )
+            members = numpy.nonzero(uncertain)
+            complete(set(members[0]) | set(members[1]))
+            if completed:
+                pair_specificity, _ = self._score_pairs(results, evaluated, failing)
+
+        member_specificity = numpy.maximum.outer(specificity, specificity)
+        is_valid = (
+            meets_recall
+            & (pair_specificity >= self.min_specificity)
+            & (pair_specificity > member_specificity)
         )
+        for i, j in zip(*numpy.nonzero(meets_recall)):
+            if is_valid[i, j]:
+                truth_table.append(self.get_conjunction([rows[i], rows[j]]))
+            if self.max_conjunction_size > 2:
+                expand(
+                    [i, j],
+                    *_conjoin(results[i], evaluated[i], results[j], evaluated[j]),
+                    member_specificity[i, j],
+                )
 
-    def rows_meet_minimum_precision(
-        self, rows_with_indices, precision_truth_table: AvicennaTruthTable
-    ) -> bool:
-        return not any(
-            precision_truth_table[idx].eval_result() < self.min_specificity
-            for idx, _ in rows_with_indices
+        logger.info(
+            "Evaluated %d conjunctions, pruned %d.",
+            self.evaluated_conjunctions,
+            self.pruned_conjunctions,
         )
 
-    def add_conjunction_to_truth_table(
-        self,
-        precision_table_rows,
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-        rows_with_indices,
-    ):
-        precision_conjunction = self.get_conjunction(precision_table_rows)
-        recall_conjunction = self.get_conjunction(
-            [recall_truth_table[idx] for idx, _ in rows_with_indices]
-        )
+    @staticmethod
+    def _score_pairs(
+        results: numpy.ndarray, evaluated: numpy.ndarray, failing: numpy.ndarray
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Computes the specificity and recall of the conjunction of every pair of
+        rows. The number of inputs two rows both hold for (or were both evaluated
+        on) is a matrix product of the 0/1 matrices, once per label. If the rows
+        were not all evaluated on the same inputs, a pair's conjunction is also
+        known where one row is unevaluated and the other is false.
+        """
 
-        if self.is_new_conjunction_valid(precision_conjunction, precision_table_rows):
-            precision_truth_table.append(precision_conjunction)
-            recall_truth_table.append(recall_conjunction)
+        def known_counts(mask: numpy.ndarray) -> numpy.ndarray:
+            counts = _pair_counts(evaluated, mask)
+            if not numpy.all(evaluated == evaluated[:1]):
+                known_false = _pair_counts(evaluated & ~results, mask, ~evaluated)
+                counts += known_false + known_false.T
+            return counts
+
+        recall = _ratio(_pair_counts(results, failing), known_counts(failing))
+        evaluated_passing = known_counts(~failing)
+        specificity = numpy.where(
+            evaluated_passing > 0,
+            1 - _ratio(_pair_counts(results, ~failing), evaluated_passing),
+            0.0,
+        )
+        return specificity, recall
+
+    def _number_of_combinations(self, number_rows: int, size: int) -> int:
+        """The number of combinations extending a combination of the given size
+        by up to `max_conjunction_size - size` of the remaining rows."""
+        return sum(
+            math.comb(number_rows, additional_rows)
+            for additional_rows in range(
+                max(1, 2 - size), self.max_conjunction_size - size + 1
+            )
+        )
 
     @staticmethod
     def get_conjunction(table_rows) -> AvicennaTruthTableRow:
@@ -499,13 +1512,13 @@ class AviIslearn(InvariantLearner, PatternLearner):
         )
         return conjunction
 
-    def is_new_conjunction_valid(
-        self, conjunction: AvicennaTruthTableRow, precision_table_rows
-    ) -> bool:
-        new_precision = 1 - conjunction.eval_result()
-        return new_precision >= self.min_specificity and all(
-            new_precision > 1 - row.eval_result() for row in precision_table_rows
+    @staticmethod
+    def get_disjunction(table_rows) -> AvicennaTruthTableRow:
+        disjunction = functools.reduce(AvicennaTruthTableRow.__or__, table_rows)
+        disjunction.formula = language.ensure_unique_bound_variables(
+            disjunction.formula
         )
+        return disjunction
 
     def _sort_inputs(
         self,
@@ -517,26 +1530,13 @@ class AviIslearn(InvariantLearner, PatternLearner):
         assert more_paths_weight or smaller_inputs_weight
         result: List[Input] = []
 
-        tree_paths = {
-            inp: {
-                path
-                for path in self.graph.k_paths_in_tree(inp.tree.to_parse_tree(), self.k)
-                if (
-                    not isinstance(path[-1], gg.TerminalNode)
-                    or (
-                        not isinstance(path[-1], gg.TerminalNode)
-                        and len(path[-1].symbol) > 1
-                    )
-                )
-            }
-            for inp in inputs
-        }
+        tree_paths = {inp: self.input_k_paths(inp) for inp in inputs}
 
         covered_paths: Set[Tuple[gg.Node, ...]] = set([])
         max_len_input = max(len(inp.tree) for inp in inputs)
 
         def uncovered_paths(inp: Input) -> Set[Tuple[gg.Node, ...]]:
-            return {path for path in tree_paths[inp] if path not in covered_paths}
+            return tree_paths[inp] - covered_paths
 
         def sort_by_paths_key(inp: Input) -> float:
             return len(uncovered_paths(inp))
@@ -557,9 +1557,17 @@ class AviIslearn(InvariantLearner, PatternLearner):
         else:
             key = sort_by_paths_and_length_key
 
-        while inputs:
-            inp = sorted(inputs, key=key, reverse=True)[0]
-            inputs.remove(inp)
+        # Lazy greedy selection: scores only decrease as more paths are
+        # covered, so a popped input whose recomputed score is unchanged beats
+        # all remaining ones. Ties go to the input that comes first in `inputs`.
+        heap = [(-key(inp), idx, inp) for idx, inp in enumerate(inputs)]
+        heapq.heapify(heap)
+        while heap:
+            score, idx, inp = heapq.heappop(heap)
+            current_score = -key(inp)
+            if current_score != score:
+                heapq.heappush(heap, (current_score, idx, inp))
+                continue
             uncovered = uncovered_paths(inp)
 
             if filter_inputs_for_learning_by_kpaths and not uncovered:
@@ -570,6 +1578,23 @@ class AviIslearn(InvariantLearner, PatternLearner):
 
         return result
 
+    def input_k_paths(self, inp: Input) -> FrozenSet[Tuple[gg.Node, ...]]:
+        """The k-paths of the input's tree that end in a nonterminal, computed on
+        first use."""
+        if inp not in self.k_paths:
+            self.k_paths[inp] = frozenset(
+                path
+                for path in self.graph.k_paths_in_tree(inp.tree.to_parse_tree(), self.k)
+                if (
+                    not isinstance(path[-1], gg.TerminalNode)
+                    or (
+                        not isinstance(path[-1], gg.TerminalNode)
+                        and len(path[-1].symbol) > 1
+                    )
+                )
+            )
+        return self.k_paths[inp]
+
     def reduce_inputs(
         self, test_inputs: Set[Input], negative_inputs: Set[Input]
     ) -> Tuple[Set[Input], Set[Input]]:
@@ -581,21 +1606,18 @@ class AvicennaPatternLearner(AviIslearn):
         self,
         positive_inputs: Set[Input],
         negative_inputs: Set[Input],
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
+        truth_table: AvicennaTruthTable,
     ):
         sorted_positive_inputs = self.sort_and_filter_inputs(self.all_positive_inputs)
         candidates = self.get_candidates(sorted_positive_inputs)
         print(f"Number of candidates: ", len(candidates))
 
-        self.evaluate_recall(candidates, recall_truth_table, positive_inputs)
-        self.filter_candidates(precision_truth_table, recall_truth_table)
-        self.evaluate_precision(
-            precision_truth_table, recall_truth_table, negative_inputs
-        )
+        self.evaluate_recall(candidates, truth_table, positive_inputs)
+        self.filter_candidates(truth_table)
+        self.evaluate_precision(truth_table, negative_inputs)
 
-        dataframe = self.build_dataframe(precision_truth_table, recall_truth_table)
-        self.learn_decision_tree(dataframe, precision_truth_table)
+        dataframe = self.build_dataframe(truth_table)
+        self.learn_decision_tree(dataframe, truth_table)
         # TODO introduce decTree
         """
          - Dataframe with index columns
@@ -604,35 +1626,24 @@ class AvicennaPatternLearner(AviIslearn):
          - Learn decision tree
         """
 
-        result = self.get_result_list(precision_truth_table, recall_truth_table)
-        print(len(precision_truth_table), len(recall_truth_table))
-        return result  # , precision_truth_table, recall_truth_table
+        result = self.get_result_list(truth_table)
+        print(len(truth_table))
+        return result
 
     @staticmethod
-    def build_dataframe(
-        precision_truth_table: AvicennaTruthTable,
-        recall_truth_table: AvicennaTruthTable,
-    ):
-        dataframe = pandas.DataFrame()
-
-        number_inputs = len(precision_truth_table.rows[0].inputs) + len(
-            recall_truth_table.rows[0].inputs
+    def build_dataframe(truth_table: AvicennaTruthTable):
+        # The evaluation matrix already holds one row per formula and one column
+        # per input; the learning data is its transpose plus the label vector.
+        number_inputs = len(truth_table.index)
+        dataframe = pandas.DataFrame(
+            truth_table.results[: len(truth_table), :number_inputs].T
         )
-        for idx, row in enumerate(precision_truth_table.rows):
-            assert row.formula == recall_truth_table.rows[idx].formula
-            dataframe[idx] = pandas.Series([numpy.nan] * number_inputs)
-            dataframe[idx] = (
-                row.eval_results + recall_truth_table.rows[idx].eval_results
-            )
-
-        dataframe["oracle"] = [False] * len(precision_truth_table.rows[0].inputs) + [
-            True
-        ] * len(recall_truth_table.rows[0].inputs)
+        dataframe["oracle"] = truth_table.index.failing
         print(dataframe)
         return dataframe
 
     @staticmethod
-    def learn_decision_tree(dataframe: pandas.DataFrame, precision_truth_table):
+    def learn_decision_tree(dataframe: pandas.DataFrame, truth_table):
         from sklearn.tree import DecisionTreeClassifier, export_text
         from isla.language import ISLaUnparser
         from avicenna.treetools import (
@@ -663,7 +1674,7 @@ class AvicennaPatternLearner(AviIslearn):
         # clf = remove_unequal_decisions(clf)
 
         names = [
-            ISLaUnparser(precision_truth_table.rows[idx].formula).unparse()
+            ISLaUnparser(truth_table.rows[idx].formula).unparse()
             for idx in dataframe.drop("oracle", axis=1).columns
         ]
 
@@ -678,12 +1689,10 @@ class AvicennaPatternLearner(AviIslearn):
         for path in paths:
             # print(path, prediction_for_path(clf, path))
             if prediction_for_path(clf, path) == OracleResult.FAILING:
-                form: Formula = precision_truth_table.rows[
-                    clf.tree_.feature[path[0]]
-                ].formula
+                form: Formula = truth_table.rows[clf.tree_.feature[path[0]]].formula
                 assert isinstance(form, Formula)
                 for elem in path[1:-1]:
-                    new = precision_truth_table.rows[clf.tree_.feature[elem]].formula
+                    new = truth_table.rows[clf.tree_.feature[elem]].formula
                     assert isinstance(new, Formula)
                     form = form.__and__(new)
                     # print("Elem: ", names[clf.tree_.feature[elem]])
@@ -0,0 +1,212 @@
+import functools
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy
+import z3
+from grammar_graph import gg
+from isla import language
+
+from avicenna.evaluation_cache import evaluate_formula
+from avicenna.input import Input
+from avicenna.tree_index import TreeIndex, Path
+
+StringPredicate = Callable[[str], bool]
+Quantifiers = Tuple[Tuple[bool, str, Optional[int]], ...]
+
+
+class StringFormula:
+    """
+    A nest of quantifiers whose innermost formula is a structural string
+    predicate on the innermost bound variable: equality with a constant,
+    `str.contains`, `str.prefixof` and `str.suffixof` with a constant on either
+    side, and their negations, conjunctions and disjunctions. Such formulas are
+    decided by comparing the strings of the subtrees in the input's
+    :class:`~avicenna.tree_index.TreeIndex`, without going through z3.
+    """
+
+    def __init__(self, quantifiers: Quantifiers, predicate: StringPredicate):
+        # (universal, nonterminal, index of the quantifier whose subtree is
+        # searched, or None for the whole input)
+        self.quantifiers = quantifiers
+        self.predicate = predicate
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def from_formula(formula: language.Formula) -> Optional["StringFormula"]:
+        quantifiers: List[Tuple[bool, str, Optional[int]]] = []
+        variables: List[language.BoundVariable] = []
+        while isinstance(formula, language.QuantifiedFormula):
+            if formula.bind_expression is not None:
+                return None
+            if isinstance(formula.in_variable, language.Constant):
+                scope = None
+            elif formula.in_variable in variables:
+                scope = variables.index(formula.in_variable)
+            else:
+                return None
+            quantifiers.append(
+                (
+                    isinstance(formula, language.ForallFormula),
+                    formula.bound_variable.n_type,
+                    scope,
+                )
+            )
+            variables.append(formula.bound_variable)
+            formula = formula.inner_formula
+
+        if not quantifiers or not isinstance(formula, language.SMTFormula):
+            return None
+        predicate = _predicate(formula.formula, variables[-1].name)
+        if predicate is None:
+            return None
+        return StringFormula(tuple(quantifiers), predicate)
+
+    def evaluate(self, index: TreeIndex) -> bool:
+        return self._evaluate(index, [])
+
+    def _evaluate(self, index: TreeIndex, assignment: List[Path]) -> bool:
+        if len(assignment) == len(self.quantifiers):
+            return self.predicate(index.strings[assignment[-1]])
+
+        universal, nonterminal, scope = self.quantifiers[len(assignment)]
+        paths = index.paths.get(nonterminal, [])
+        if scope is not None:
+            prefix = assignment[scope]
+            paths = [path for path in paths if path[: len(prefix)] == prefix]
+        results = (self._evaluate(index, assignment + [path]) for path in paths)
+        return all(results) if universal else any(results)
+
+
+class Bindings:
+    """
+    The binding tuples of a quantifier prefix in a batch of inputs, matched
+    once and shared by all formulas with that prefix. Level `k` holds the
+    bindings of the first `k + 1` variables, grouped by the binding of the
+    first `k` ones; the strings of the innermost subtrees are deduplicated, so
+    each predicate is applied once per distinct string.
+    """
+
+    def __init__(self, quantifiers: Quantifiers, indices: Sequence[TreeIndex]):
+        self.quantifiers = quantifiers
+        # For each level, the bindings of the previous level delimit their
+        # children by these offsets.
+        self.offsets: List[numpy.ndarray] = []
+        assignments: List[Tuple[int, Tuple[Path, ...]]] = [
+            (idx, ()) for idx in range(len(indices))
+        ]
+        for _, nonterminal, scope in quantifiers:
+            children: List[Tuple[int, Tuple[Path, ...]]] = []
+            offsets = [0]
+            for idx, assignment in assignments:
+                paths = indices[idx].paths.get(nonterminal, [])
+                if scope is not None:
+                    prefix = assignment[scope]
+                    paths = [path for path in paths if path[: len(prefix)] == prefix]
+                children.extend((idx, assignment + (path,)) for path in paths)
+                offsets.append(len(children))
+            self.offsets.append(numpy.array(offsets))
+            assignments = children
+
+        strings: Dict[str, int] = {}
+        self.leaves = numpy.array(
+            [
+                strings.setdefault(indices[idx].strings[assignment[-1]], len(strings))
+                for idx, assignment in assignments
+            ],
+            dtype=int,
+        )
+        self.strings = list(strings)
+
+    def evaluate(self, predicate: StringPredicate) -> numpy.ndarray:
+        """The truth value of the quantified predicate for each input."""
+        values = numpy.array([predicate(string) for string in self.strings], bool)
+        values = values[self.leaves]
+        for (universal, _, _), offsets in zip(
+            reversed(self.quantifiers), reversed(self.offsets)
+        ):
+            true_counts = numpy.concatenate(([0], numpy.cumsum(values)))
+            true_counts = true_counts[offsets[1:]] - true_counts[offsets[:-1]]
+            values = (
+                true_counts == numpy.diff(offsets) if universal else true_counts > 0
+            )
+        return values
+
+
+def evaluate_batch(
+    formulas: Sequence[language.Formula],
+    inputs: Sequence[Input],
+    graph: gg.GrammarGraph,
+) -> numpy.ndarray:
+    """
+    Evaluates all formulas on all inputs and returns the results as a matrix
+    with a row per formula. The bindings of :class:`StringFormula` instances are
+    matched once per quantifier prefix; the remaining formulas are evaluated
+    one input at a time.
+    """
+    results = numpy.zeros((len(formulas), len(inputs)), dtype=bool)
+    groups: Dict[Quantifiers, List[Tuple[int, StringFormula]]] = {}
+    for formula_id, formula in enumerate(formulas):
+        string_formula = StringFormula.from_formula(formula)
+        if string_formula is None:
+            results[formula_id] = [
+                evaluate_formula(formula, inp, graph) for inp in inputs
+            ]
+        else:
+            groups.setdefault(string_formula.quantifiers, []).append(
+                (formula_id, string_formula)
+            )
+
+    indices = [inp.tree_index for inp in inputs]
+    for quantifiers, group in groups.items():
+        bindings = Bindings(quantifiers, indices)
+        for formula_id, string_formula in group:
+            results[formula_id] = bindings.evaluate(string_formula.predicate)
+    return results
+
+
+def _predicate(expression: z3.ExprRef, variable: str) -> Optional[StringPredicate]:
+    kind = expression.decl().kind()
+    if kind == z3.Z3_OP_NOT:
+        inner = _predicate(expression.arg(0), variable)
+        return None if inner is None else lambda value: not inner(value)
+    if kind in (z3.Z3_OP_AND, z3.Z3_OP_OR):
+        predicates = [_predicate(arg, variable) for arg in expression.children()]
+        if None in predicates:
+            return None
+        combine = all if kind == z3.Z3_OP_AND else any
+        return lambda value: combine(predicate(value) for predicate in predicates)
+    if expression.num_args() != 2:
+        return None
+
+    left, right = expression.children()
+    if _is_variable(left, variable) and z3.is_string_value(right):
+        constant, variable_first = right.as_string(), True
+    elif z3.is_string_value(left) and _is_variable(right, variable):
+        constant, variable_first = left.as_string(), False
+    else:
+        return None
+
+    if kind == z3.Z3_OP_EQ:
+        return lambda value: value == constant
+    if kind == z3.Z3_OP_SEQ_CONTAINS:
+        if variable_first:
+            return lambda value: constant in value
+        return lambda value: value in constant
+    if kind == z3.Z3_OP_SEQ_PREFIX:
+        if variable_first:
+            return lambda value: constant.startswith(value)
+        return lambda value: value.startswith(constant)
+    if kind == z3.Z3_OP_SEQ_SUFFIX:
+        if variable_first:
+            return lambda value: constant.endswith(value)
+        return lambda value: value.endswith(constant)
+    return None
+
+
+def _is_variable(expression: z3.ExprRef, variable: str) -> bool:
+    return (
+        z3.is_const(expression)
+        and not z3.is_string_value(expression)
+        and expression.sort() == z3.StringSort()
+        and str(expression) == variable
+    )
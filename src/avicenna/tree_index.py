@@ -0,0 +1,110 @@
+from typing import Dict, List, Tuple, Iterator, Optional
+
+from fuzzingbook.Grammars import is_nonterminal
+from isla import language
+from isla.derivation_tree import DerivationTree
+
+Path = Tuple[int, ...]
+
+
+class SubtreeStrings:
+    """The strings of the subtrees by path, sliced from the string of the whole
+    tree on each access. The slices are not kept: nested nonterminals such as
+    `<digits>` would otherwise retain memory quadratic in the tree size."""
+
+    __slots__ = ("text", "spans")
+
+    def __init__(self, text: str, spans: Dict[Path, Tuple[int, int]]):
+        self.text = text
+        self.spans = spans
+
+    def __getitem__(self, path: Path) -> str:
+        start, end = self.spans[path]
+        return self.text[start:end]
+
+
+class TreeIndex:
+    """
+    Everything the learner looks up in a derivation tree, computed in a single
+    walk: the paths of the subtrees of each nonterminal, and the string and
+    length of every subtree. :class:`~avicenna.input.Input` builds it lazily and
+    shares it between formula evaluation and feature collection.
+
+    The walk records the span of each subtree in the string of the whole tree,
+    so lengths are differences of offsets and the string of a subtree is only
+    sliced out, and dropped again, when it is looked up. The index thus takes
+    memory linear in the size of the tree, also for deeply nested nonterminals.
+    """
+
+    def __init__(self, tree: DerivationTree):
+        self.tree = tree
+        # Subtrees in pre-order, i.e., parents before their children.
+        self.subtrees: Dict[Path, DerivationTree] = {}
+        self.paths: Dict[str, List[Path]] = {}
+        self.spans: Dict[Path, Tuple[int, int]] = {}
+
+        terminals: List[str] = []
+        offset = 0
+        starts: Dict[Path, int] = {}
+        stack: List[Tuple[Path, DerivationTree, bool]] = [((), tree, False)]
+        while stack:
+            path, subtree, children_done = stack.pop()
+            if children_done:
+                self.spans[path] = (starts.pop(path), offset)
+                continue
+
+            self.subtrees[path] = subtree
+            if is_nonterminal(subtree.value):
+                self.paths.setdefault(subtree.value, []).append(path)
+            if not subtree.children:
+                terminal = "" if is_nonterminal(subtree.value) else subtree.value
+                terminals.append(terminal)
+                self.spans[path] = (offset, offset + len(terminal))
+                offset += len(terminal)
+                continue
+
+            starts[path] = offset
+            stack.append((path, subtree, True))
+            for idx in reversed(range(len(subtree.children))):
+                stack.append((path + (idx,), subtree.children[idx], False))
+
+        self.strings = SubtreeStrings("".join(terminals), self.spans)
+
+    def __iter__(self) -> Iterator[Tuple[Path, DerivationTree]]:
+        return iter(self.subtrees.items())
+
+    def __contains__(self, nonterminal: str) -> bool:
+        return nonterminal in self.paths
+
+    def length(self, path: Path) -> int:
+        start, end = self.spans[path]
+        return end - start
+
+    def decide(self, formula: language.Formula) -> Optional[bool]:
+        """
+        The truth value of `formula` if it follows from the nonterminals in the
+        tree alone, and None otherwise: a quantifier over the whole input whose
+        nonterminal does not occur in the tree holds vacuously (forall) or not
+        at all (exists).
+        """
+        if isinstance(formula, language.QuantifiedFormula):
+            if (
+                isinstance(formula.in_variable, language.Constant)
+                and formula.bound_variable.n_type not in self
+            ):
+                return isinstance(formula, language.ForallFormula)
+            return None
+        if isinstance(formula, language.NegatedFormula):
+            result = self.decide(formula.args[0])
+            return None if result is None else not result
+        if isinstance(formula, language.ConjunctiveFormula):
+            results = [self.decide(arg) for arg in formula.args]
+            if False in results:
+                return False
+            return True if all(results) else None
+        if isinstance(formula, language.DisjunctiveFormula):
+            results = [self.decide(arg) for arg in formula.args]
+            if True in results:
+                return True
+            return False if results.count(False) == len(results) else None
+        return None
@@ -2,6 +2,18 @@ import unittest
 
 from avicenna_formalizations.calculator import oracle, grammar, initial_inputs
 from avicenna.avicenna import Avicenna
+from avicenna.feature_collector import GrammarFeatureCollector
+from avicenna.input import Input
+
+
+class CountingFeatureCollector(GrammarFeatureCollector):
+    def __init__(self, grammar):
+        super().__init__(grammar)
+        self.collected = []
+
+    def collect_features(self, test_input):
+        self.collected.append(test_input)
+        return super().collect_features(test_input)
 
 
 class TestAvicenna(unittest.TestCase):
@@ -49,6 +61,23 @@ class TestAvicenna(unittest.TestCase):
             lambda: avicenna.explain(),
         )
 
+    def test_assign_feature_vector_collects_only_new_inputs(self):
+        avicenna = Avicenna.__new__(Avicenna)
+        avicenna.collector = CountingFeatureCollector(grammar)
+        known = {Input.from_str(grammar, inp) for inp in ["sqrt(-900)", "cos(10)"]}
+        avicenna.assign_feature_vector(known)
+        features = {inp: inp.features for inp in known}
+
+        new = {Input.from_str(grammar, inp) for inp in ["tan(-1)", "sqrt(4)"]}
+        avicenna.collector.collected.clear()
+        self.assertEqual(avicenna.assign_feature_vector(known | new), known | new)
+
+        self.assertEqual(set(avicenna.collector.collected), new)
+        for inp in known:
+            self.assertIs(inp.features, features[inp])
+        for inp in new:
+            self.assertIsNotNone(inp.features)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,141 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy
+from debugging_framework.oracle import OracleResult
+
+from avicenna_formalizations.calculator import grammar, initial_inputs, arith_eval
+from avicenna_formalizations import get_pattern_file_path
+from avicenna.avicenna import Avicenna
+from avicenna.input import Input
+from avicenna.checkpoint import Checkpoint, save_checkpoint, load_checkpoint
+from avicenna.pattern_learner import AviIslearn, AvicennaTruthTable
+from avicenna.report import Failure
+
+
+class CalculatorError(Exception):
+    pass
+
+
+def raising_oracle(inp):
+    try:
+        arith_eval(inp)
+        return OracleResult.PASSING, None
+    except ValueError as exception:
+        return OracleResult.FAILING, CalculatorError(str(exception))
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inputs = {
+            Input.from_str(grammar, inp, inp_oracle)
+            for inp, inp_oracle in [
+                ("sqrt(-901)", OracleResult.FAILING),
+                ("sqrt(-8)", OracleResult.FAILING),
+                ("sqrt(10)", OracleResult.PASSING),
+                ("cos(1)", OracleResult.PASSING),
+                ("tan(-20)", OracleResult.PASSING),
+            ]
+        }
+        self.truth_table = AvicennaTruthTable()
+        learner = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        self.result = learner.learn_failure_invariants(self.inputs, self.truth_table)
+
+    def test_round_trip(self):
+        failing = {inp for inp in self.inputs if inp.oracle == OracleResult.FAILING}
+        checkpoint = Checkpoint(
+            iteration=3,
+            inputs=self.inputs,
+            truth_table=self.truth_table,
+            pending_inputs={Input.from_str(grammar, "sin(-2)")},
+            failures={Failure(ValueError("math domain error")): failing},
+            best_candidates={self.result[0][0]},
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "avicenna.npz"
+            save_checkpoint(path, checkpoint)
+            restored = load_checkpoint(path, grammar)
+
+        self.assertEqual(restored.iteration, 3)
+        self.assertEqual(restored.inputs, self.inputs)
+        self.assertEqual(
+            {(str(inp), inp.oracle) for inp in restored.inputs},
+            {(str(inp), inp.oracle) for inp in self.inputs},
+        )
+        self.assertEqual({str(inp) for inp in restored.pending_inputs}, {"sin(-2)"})
+        self.assertIsNone(next(iter(restored.pending_inputs)).oracle)
+        self.assertEqual(
+            restored.failures, {Failure(ValueError("math domain error")): failing}
+        )
+        self.assertEqual(restored.best_candidates, {self.result[0][0]})
+
+        table = restored.truth_table
+        self.assertEqual(
+            [row.formula for row in table], [row.formula for row in self.truth_table]
+        )
+        for restored_scores, scores in zip(table.scores(), self.truth_table.scores()):
+            self.assertTrue(numpy.array_equal(restored_scores, scores))
+
+    def test_failed_save_keeps_previous_checkpoint(self):
+        checkpoint = Checkpoint(
+            iteration=1, inputs=self.inputs, truth_table=self.truth_table
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "avicenna.npz"
+            save_checkpoint(path, checkpoint)
+
+            # Unlabeled inputs make the archive fail halfway through writing.
+            unlabeled = Input.from_str(grammar, "sin(-2)")
+            broken = Checkpoint(
+                iteration=2,
+                inputs=self.inputs | {unlabeled},
+                truth_table=self.truth_table,
+            )
+            self.assertRaises(AttributeError, save_checkpoint, path, broken)
+            self.assertEqual(list(Path(directory).iterdir()), [path])
+            self.assertEqual(load_checkpoint(path, grammar).iteration, 1)
+
+    def test_resume(self):
+        failure = Failure(CalculatorError("math domain error"))
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "avicenna.npz"
+            first = Avicenna(
+                grammar=grammar,
+                oracle=raising_oracle,
+                initial_inputs=initial_inputs,
+                max_iterations=1,
+                checkpoint_path=path,
+            )
+            for inp in first.all_inputs:
+                if inp.oracle == OracleResult.FAILING:
+                    first.report.add_failure(inp, raising_oracle(inp)[1])
+            first.explain()
+
+            resumed = Avicenna(
+                grammar=grammar,
+                oracle=raising_oracle,
+                initial_inputs=initial_inputs,
+                max_iterations=2,
+            )
+            resumed.resume(path)
+
+        self.assertEqual(resumed._iteration, 2)
+        self.assertLessEqual(
+            {str(inp) for inp in first.all_inputs},
+            {str(inp) for inp in resumed.all_inputs},
+        )
+        # Failures of the same type recorded after resuming join those from
+        # before the checkpoint.
+        inp = Input.from_str(grammar, "sqrt(-5)")
+        resumed.report.add_failure(inp, raising_oracle(inp)[1])
+        failures = resumed.report.get_failures()
+        self.assertEqual(list(failures), [failure])
+        self.assertIsInstance(next(iter(failures)).exception, CalculatorError)
+        self.assertEqual(
+            {str(inp) for inp in failures[failure]}, {"sqrt(-900)", "sqrt(-5)"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import gc
+import tempfile
+import unittest
+import weakref
+from pathlib import Path
+
+from isla.language import parse_isla
+from grammar_graph import gg
+from debugging_framework.oracle import OracleResult
+
+from avicenna_formalizations.calculator import grammar, oracle
+from avicenna_formalizations import get_pattern_file_path
+from avicenna.input import Input
+from avicenna.evaluation_cache import EvaluationCache
+from avicenna.pattern_learner import AviIslearn, AvicennaTruthTable
+
+
+class TestEvaluationCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.graph = gg.GrammarGraph.from_grammar(grammar)
+        self.formula = parse_isla(
+            'exists <function> elem in start: (= elem "sqrt")', grammar
+        )
+        self.inputs = [
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in ["sqrt(-1)", "cos(2)", "tan(-3)"]
+        ]
+
+    def test_hits_and_misses(self):
+        cache = EvaluationCache()
+        first = [cache.evaluate(self.formula, inp, self.graph) for inp in self.inputs]
+        second = [cache.evaluate(self.formula, inp, self.graph) for inp in self.inputs]
+
+        self.assertEqual(first, [True, False, False])
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = EvaluationCache(max_size=2)
+        first, second, third = self.inputs
+        cache.put(self.formula, first, True)
+        cache.put(self.formula, second, False)
+        cache.get(self.formula, first)
+        cache.put(self.formula, third, False)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(self.formula, second))
+        self.assertTrue(cache.get(self.formula, first))
+
+    def test_cache_does_not_keep_inputs_alive(self):
+        cache = EvaluationCache()
+        inp = Input.from_str(grammar, "sqrt(-4)")
+        self.assertTrue(cache.evaluate(self.formula, inp, self.graph))
+        reference = weakref.ref(inp)
+        del inp
+        gc.collect()
+
+        self.assertIsNone(reference())
+        self.assertTrue(cache.get(self.formula, Input.from_str(grammar, "sqrt(-4)")))
+
+    def test_results_persist_on_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "evaluations.db"
+            cache = EvaluationCache(path=path)
+            for inp in self.inputs:
+                cache.evaluate(self.formula, inp, self.graph)
+            cache.close()
+
+            cache = EvaluationCache(path=path)
+            reparsed = [Input.from_str(grammar, str(inp)) for inp in self.inputs]
+            results = [cache.get(self.formula, inp) for inp in reparsed]
+            cache.close()
+
+        self.assertEqual(results, [True, False, False])
+        self.assertEqual((cache.hits, cache.misses), (3, 0))
+
+    def test_learner_reuses_cached_evaluations(self):
+        test_inputs = {
+            Input.from_str(grammar, inp, inp_oracle)
+            for inp, inp_oracle in [
+                ("sqrt(-901)", OracleResult.FAILING),
+                ("sqrt(-8)", OracleResult.FAILING),
+                ("sqrt(10)", OracleResult.PASSING),
+                ("cos(1)", OracleResult.PASSING),
+                ("tan(-20)", OracleResult.PASSING),
+            ]
+        }
+        cache = EvaluationCache()
+        results = []
+        misses = []
+        for _ in range(2):
+            learner = AviIslearn(
+                grammar,
+                pattern_file=str(get_pattern_file_path()),
+                evaluation_cache=cache,
+            )
+            results.append(
+                learner.learn_failure_invariants(test_inputs, AvicennaTruthTable())
+            )
+            misses.append(cache.misses)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(misses[0], misses[1])
+        self.assertEqual(cache.hits, cache.misses)
+
+
+if __name__ == "__main__":
+    unittest.main()
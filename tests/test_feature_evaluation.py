@@ -0,0 +1,70 @@
+import unittest
+
+from isla.evaluator import evaluate
+from isla.language import parse_isla
+from grammar_graph import gg
+
+from avicenna_formalizations.calculator import grammar
+from avicenna.input import Input
+from avicenna.feature_collector import GrammarFeatureCollector
+from avicenna.feature_evaluation import FeatureBound
+from avicenna.features import NumericFeature
+
+
+class TestFeatureEvaluation(unittest.TestCase):
+    def setUp(self) -> None:
+        collector = GrammarFeatureCollector(grammar)
+        self.inputs = [
+            Input.from_str(grammar, inp)
+            for inp in ["sqrt(-12.5)", "cos(1)", "tan(-900)", "sin(37)", "sqrt(4.25)"]
+        ]
+        for inp in self.inputs:
+            inp.features = collector.collect_features(inp)
+        self.numeric_nonterminals = {
+            feature.non_terminal for feature in NumericFeature.factory_method(grammar)
+        }
+        self.graph = gg.GrammarGraph.from_grammar(grammar)
+
+    def bound(self, formula: str):
+        return FeatureBound.from_formula(
+            parse_isla(formula, grammar), self.numeric_nonterminals
+        )
+
+    def test_bounds_match_evaluator(self):
+        formulas = [
+            'exists <number> elem in start: (>= (str.to.int elem) (str.to.int "-12"))',
+            'exists <number> elem in start: (> (str.to.int elem) (str.to.int "4"))',
+            'exists <maybe_frac> elem in start: (>= (str.to.int elem) (str.to.int "0"))',
+            'exists <number> elem in start: (<= (str.to.int "37") (str.to.int elem))',
+            "exists <digits> elem in start: (>= (str.len elem) 2)",
+            "forall <digits> elem in start: (< (str.len elem) 3)",
+            "forall <maybe_digits> elem in start: (<= (str.len elem) 1)",
+        ]
+        for formula in formulas:
+            bound = self.bound(formula)
+            self.assertIsNotNone(bound, formula)
+            expected = [
+                evaluate(
+                    parse_isla(formula, grammar), inp.tree, grammar, graph=self.graph
+                ).is_true()
+                for inp in self.inputs
+            ]
+            self.assertEqual(list(bound.evaluate(self.inputs)), expected, formula)
+
+    def test_other_shapes_fall_back(self):
+        for formula in [
+            'forall <number> elem in start: (<= (str.to.int elem) (str.to.int "1"))',
+            'exists <number> elem in start: (< (str.to.int elem) (str.to.int "1"))',
+            'exists <function> elem in start: (>= (str.to.int elem) (str.to.int "1"))',
+            'exists <number> elem in start: (= (str.to.int elem) (str.to.int "1"))',
+            'exists <number> elem in start: (>= (str.to.int elem) (str.to.int "x"))',
+            'not(exists <number> elem in start: (>= (str.to.int elem) (str.to.int "2")))',
+        ]:
+            self.assertIsNone(self.bound(formula), formula)
+
+        bound = self.bound("exists <digits> elem in start: (>= (str.len elem) 2)")
+        self.assertIsNone(bound.evaluate([Input.from_str(grammar, "cos(12)")]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ from numpy import inf
 from fuzzingbook.Grammars import Grammar, is_valid_grammar, srange
 
 from avicenna.input import Input
+from avicenna.features import FeatureVector
 from avicenna.feature_collector import (
     FeatureFactory,
     ExistenceFeature,
@@ -12,6 +13,7 @@ from avicenna.feature_collector import (
     NumericFeature,
     LengthFeature,
     GrammarFeatureCollector,
+    FeatureSpace,
 )
 
 grammar: Grammar = {
@@ -100,6 +102,14 @@ class FeatureExtraction(unittest.TestCase):
         features = factory.build([NumericFeature])
 
         self.assertEqual(set(features), set(expected_feature_list))
+        self.assertEqual(
+            set(
+                NumericFeature.get_features(
+                    NumericFeature.get_derivable_chars(grammar_with_maybe_minus)
+                )
+            ),
+            set(expected_feature_list),
+        )
 
     def test_build_length_feature(self):
         expected_feature_list = [
@@ -342,6 +352,32 @@ class FeatureExtraction(unittest.TestCase):
             feature_vector = collector.collect_features(test_input)
             self.assertEqual(feature_vector.features, expected_feature_vectors)
 
+    def test_feature_vectors_share_interned_ids(self):
+        collector = GrammarFeatureCollector(grammar_rec)
+        other_collector = GrammarFeatureCollector(grammar_rec)
+        self.assertIs(collector.space, other_collector.space)
+
+        feature_vector = collector.collect_features(Input.from_str(grammar_rec, "12"))
+        features = [
+            LengthFeature("<B>"),
+            NumericFeature("<B>"),
+            ExistenceFeature("<A>"),
+        ]
+        self.assertEqual(
+            list(feature_vector.get_feature_values(collector.space.ids_of(features))),
+            [2, 12, 0],
+        )
+
+        feature_vector.set_feature(LengthFeature("<B>"), 1)
+        feature_vector.set_feature(LengthFeature("<unknown>"), 5)
+        self.assertEqual(feature_vector.get_feature_value(LengthFeature("<B>")), 2)
+        self.assertEqual(feature_vector.features[LengthFeature("<unknown>")], 5)
+
+        empty = FeatureVector("12", space=FeatureSpace())
+        self.assertFalse(empty.has_feature(NumericFeature("<B>")))
+        self.assertEqual(empty.get_feature_value(NumericFeature("<B>")), -inf)
+        self.assertEqual(empty.features, {})
+
 
 if __name__ == "__main__":
     unittest.main()
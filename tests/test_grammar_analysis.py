@@ -0,0 +1,54 @@
+import unittest
+
+from grammar_graph import gg
+
+from avicenna_formalizations.calculator import grammar
+from avicenna.grammar_analysis import analyze, grammar_fingerprint
+
+
+class TestGrammarAnalysis(unittest.TestCase):
+    def setUp(self) -> None:
+        self.analysis = analyze(grammar)
+
+    def test_analysis_is_shared_per_grammar(self):
+        self.assertIs(analyze(dict(grammar)), self.analysis)
+        changed = dict(grammar, **{"<maybe_minus>": ["", "-", "+"]})
+        self.assertNotEqual(grammar_fingerprint(changed), grammar_fingerprint(grammar))
+        self.assertIsNot(analyze(changed), self.analysis)
+
+    def test_reachability_matches_grammar_graph(self):
+        graph = gg.GrammarGraph.from_grammar(grammar)
+        for nonterminal in grammar:
+            for other in grammar:
+                self.assertEqual(
+                    self.analysis.reaches(nonterminal, other),
+                    graph.reachable(nonterminal, other),
+                )
+        self.assertTrue(self.analysis.reaches("<digits>", "<digits>"))
+        self.assertFalse(self.analysis.reaches("<number>", "<number>"))
+
+    def test_derivable_chars(self):
+        self.assertEqual(self.analysis.derivable_chars["<maybe_minus>"], {"-"})
+        self.assertEqual(self.analysis.derivable_chars["<number>"], set("-.0123456789"))
+        self.assertEqual(
+            self.analysis.expansions["<digits>"],
+            [("<digit>",), ("<digit>", "<digits>")],
+        )
+        self.assertEqual(
+            self.analysis.nullable, {"<maybe_minus>", "<maybe_digits>", "<maybe_frac>"}
+        )
+        self.assertEqual(
+            set(self.analysis.numeric_nonterminals),
+            {
+                "<number>",
+                "<onenine>",
+                "<digit>",
+                "<maybe_digits>",
+                "<digits>",
+                "<maybe_frac>",
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
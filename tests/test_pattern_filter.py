@@ -0,0 +1,58 @@
+import unittest
+
+from islearn.language import parse_abstract_isla
+
+from avicenna_formalizations.calculator import grammar
+from avicenna.grammar_analysis import analyze
+from avicenna.pattern_filter import PatternFilter
+
+
+class TestPatternFilter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pattern_filter = PatternFilter(analyze(grammar))
+        self.existence = parse_abstract_isla(
+            """exists <?NONTERMINAL> elem in start:
+                (= elem <?STRING>)""",
+            grammar,
+        )
+        self.container = parse_abstract_isla(
+            """forall <?NONTERMINAL> container in start:
+                exists <?NONTERMINAL> elem in container:
+                  (= elem <?STRING>)""",
+            grammar,
+        )
+        self.numeric = parse_abstract_isla(
+            """exists <?NONTERMINAL> elem in start:
+                (>= (str.to.int elem) (str.to.int <?STRING>))""",
+            grammar,
+        )
+        self.patterns = [self.existence, self.container, self.numeric]
+
+    def keep_only(self, *nonterminals: str):
+        return set(grammar) - set(nonterminals)
+
+    def test_nothing_excluded(self):
+        self.assertEqual(self.pattern_filter.filter(self.patterns), self.patterns)
+
+    def test_placeholders_need_admissible_nonterminals(self):
+        self.assertEqual(
+            self.pattern_filter.filter(self.patterns, self.keep_only("<function>")),
+            [self.existence],
+        )
+        self.assertEqual(
+            self.pattern_filter.filter(
+                self.patterns, self.keep_only("<number>", "<function>")
+            ),
+            [self.existence, self.numeric],
+        )
+        self.assertEqual(
+            self.pattern_filter.filter(
+                self.patterns, self.keep_only("<number>", "<digits>")
+            ),
+            self.patterns,
+        )
+        self.assertEqual(self.pattern_filter.filter(self.patterns, set(grammar)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,19 @@
+import copy
+import itertools
+import math
 import unittest
 
-from isla.language import ISLaUnparser
+import numpy
+from islearn.learner import weighted_geometric_mean
+
+from isla.language import (
+    ISLaUnparser,
+    parse_isla,
+    ConjunctiveFormula,
+    DisjunctiveFormula,
+)
 from isla.fuzzer import GrammarFuzzer
+from grammar_graph import gg
 
 from debugging_framework.oracle import OracleResult
 
@@ -11,7 +23,364 @@ from avicenna_formalizations.calculator import (
 )
 from avicenna_formalizations import get_pattern_file_path
 from avicenna.input import Input
-from avicenna.pattern_learner import AviIslearn, AvicennaTruthTable
+from avicenna.feature_collector import GrammarFeatureCollector
+from avicenna.pattern_learner import (
+    AviIslearn,
+    AvicennaTruthTable,
+    AvicennaTruthTableRow,
+    InputIndex,
+)
+
+
+class TestAvicennaTruthTableRow(unittest.TestCase):
+    def setUp(self) -> None:
+        self.graph = gg.GrammarGraph.from_grammar(grammar)
+        self.inputs = [
+            Input.from_str(grammar, inp)
+            for inp in ["sqrt(-1)", "sqrt(4)", "cos(-2)", "sin(3)"]
+        ]
+        self.sqrt = parse_isla(
+            'exists <function> elem in start: (= elem "sqrt")', grammar
+        )
+        self.minus = parse_isla(
+            'exists <maybe_minus> elem in start: (= elem "-")', grammar
+        )
+
+    def evaluated_row(self, formula, index: InputIndex) -> AvicennaTruthTableRow:
+        row = AvicennaTruthTableRow(formula, index)
+        row.evaluate(set(self.inputs), self.graph)
+        return row
+
+    def test_rows_are_aligned_to_input_index(self):
+        index = InputIndex()
+        sqrt_row = self.evaluated_row(self.sqrt, index)
+        minus_row = self.evaluated_row(self.minus, index)
+
+        self.assertEqual(len(index), len(self.inputs))
+        self.assertEqual(len(sqrt_row), 4)
+        self.assertEqual(sqrt_row.eval_result(), 0.5)
+        self.assertEqual(minus_row.eval_result(), 0.5)
+
+        for inp in self.inputs:
+            position = index.position(inp)
+            self.assertEqual(sqrt_row.results[position], str(inp).startswith("sqrt"))
+            self.assertEqual(minus_row.results[position], "-" in str(inp))
+
+    def test_conjunction_and_negation(self):
+        index = InputIndex()
+        sqrt_row = self.evaluated_row(self.sqrt, index)
+        minus_row = self.evaluated_row(self.minus, index)
+
+        conjunction = sqrt_row & minus_row
+        self.assertEqual(conjunction.formula, self.sqrt & self.minus)
+        self.assertEqual(conjunction.eval_result(), 0.25)
+        self.assertTrue(conjunction.results[index.position(self.inputs[0])])
+
+        negation = -sqrt_row
+        self.assertEqual(negation.eval_result(), 0.5)
+        self.assertEqual(len(negation), len(sqrt_row))
+        self.assertFalse(any(negation.results & sqrt_row.results))
+
+    def test_incremental_evaluation_only_adds_new_inputs(self):
+        index = InputIndex()
+        row = AvicennaTruthTableRow(self.sqrt, index)
+        row.evaluate(set(self.inputs[:2]), self.graph)
+        self.assertEqual(row.eval_result(), 1.0)
+
+        row.evaluate(set(self.inputs), self.graph)
+        self.assertEqual(len(row), 4)
+        self.assertEqual(row.eval_result(), 0.5)
+
+    def test_rows_track_evaluated_inputs_in_the_shared_index(self):
+        index = InputIndex()
+        positions = index.positions(self.inputs)
+        self.assertEqual(list(positions), [0, 1, 2, 3])
+        self.assertIs(index[2], self.inputs[2])
+
+        row = AvicennaTruthTableRow(self.sqrt, index)
+        row.evaluate(self.inputs[1:3], self.graph)
+        self.assertEqual(list(row.unevaluated(positions)), [0, 3])
+        self.assertEqual(len(index), 4)
+
+    def test_conjunction_is_known_where_a_member_is_false(self):
+        index = InputIndex()
+        sqrt_row = self.evaluated_row(self.sqrt, index)
+        minus_row = AvicennaTruthTableRow(self.minus, index)
+        minus_row.evaluate(self.inputs[:1], self.graph)
+
+        conjunction = sqrt_row & minus_row
+        known = {
+            str(inp)
+            for inp in self.inputs
+            if conjunction.evaluated[index.position(inp)]
+        }
+        self.assertEqual(known, {"sqrt(-1)", "cos(-2)", "sin(3)"})
+        self.assertEqual(conjunction.true_count(), 1)
+
+    def test_disjunction_is_known_where_a_member_is_true(self):
+        index = InputIndex()
+        sqrt_row = self.evaluated_row(self.sqrt, index)
+        minus_row = AvicennaTruthTableRow(self.minus, index)
+        minus_row.evaluate(self.inputs[2:3], self.graph)
+
+        disjunction = sqrt_row | minus_row
+        self.assertEqual(disjunction.formula, self.sqrt | self.minus)
+        known = {
+            str(inp)
+            for inp in self.inputs
+            if disjunction.evaluated[index.position(inp)]
+        }
+        self.assertEqual(known, {"sqrt(-1)", "sqrt(4)", "cos(-2)"})
+        self.assertEqual(disjunction.true_count(), 3)
+
+    def test_stopping_rule(self):
+        # 5 of 10 passing inputs are false positives: specificity < 0.6 for sure.
+        self.assertTrue(AvicennaTruthTableRow.should_stop_evaluation(5, 6, 10, 0.6))
+        self.assertFalse(AvicennaTruthTableRow.should_stop_evaluation(4, 6, 10, 0.6))
+        # With a confidence interval, a clean record is enough evidence as well.
+        self.assertFalse(AvicennaTruthTableRow.should_stop_evaluation(0, 30, 100, 0.6))
+        self.assertTrue(
+            AvicennaTruthTableRow.should_stop_evaluation(0, 30, 100, 0.6, 2.58)
+        )
+        self.assertFalse(
+            AvicennaTruthTableRow.should_stop_evaluation(1, 3, 100, 0.6, 2.58)
+        )
+
+
+class TestAvicennaTruthTable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.formulas = [
+            parse_isla(
+                f'exists <function> elem in start: (= elem "{function}")', grammar
+            )
+            for function in ["sqrt", "sin", "cos", "tan"]
+        ]
+
+    def assert_indices_consistent(self, table: AvicennaTruthTable):
+        self.assertEqual(len(table.rows_by_formula), len(table))
+        for position, row in enumerate(table):
+            self.assertIs(table[row.formula], row)
+            self.assertEqual(table.position(row.formula), position)
+            self.assertTrue(numpy.array_equal(row.results, table.results[position]))
+
+    def test_scores_are_derived_from_the_evaluation_matrix(self):
+        graph = gg.GrammarGraph.from_grammar(grammar)
+        test_inputs = {
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in ["sqrt(-1)", "sqrt(-2)", "sqrt(4)", "cos(-2)", "sin(3)"]
+        }
+        table = AvicennaTruthTable()
+        for formula in self.formulas:
+            row = AvicennaTruthTableRow(formula, table.index)
+            row.evaluate(test_inputs, graph)
+            table.append(row)
+
+        specificity, recall = table.scores()
+        for idx, row in enumerate(table):
+            self.assertEqual(specificity[idx], row.specificity())
+            self.assertEqual(recall[idx], row.recall())
+
+        sqrt_row = table[self.formulas[0]]
+        self.assertEqual(sqrt_row.recall(), 1.0)
+        self.assertAlmostEqual(sqrt_row.specificity(), 2 / 3)
+
+        table.remove(table[self.formulas[1]])
+        self.assertEqual(len(table.scores()[0]), 3)
+        self.assert_indices_consistent(table)
+
+    def test_ranking_keeps_the_best_rows(self):
+        graph = gg.GrammarGraph.from_grammar(grammar)
+        test_inputs = {
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in ["sqrt(-1)", "sqrt(-2)", "sqrt(4)", "cos(-2)", "sin(3)"]
+        }
+        minus = parse_isla('exists <maybe_minus> elem in start: (= elem "-")', grammar)
+        table = AvicennaTruthTable()
+        for formula in self.formulas + [minus, self.formulas[0] & minus]:
+            row = AvicennaTruthTableRow(formula, table.index)
+            row.evaluate(test_inputs, graph)
+            table.append(row)
+
+        specificity, recall = table.scores()
+        expected = sorted(
+            (
+                (row.formula, float(specificity[idx]), float(recall[idx]))
+                for idx, row in enumerate(table)
+            ),
+            key=lambda x: (x[1], x[2], -len(x[0])),
+            reverse=True,
+        )
+        self.assertEqual(table.ranking(), expected)
+        for k in range(len(table) + 1):
+            self.assertEqual(table.ranking(k=k), expected[:k])
+        self.assertEqual(
+            table.ranking(0.5, 1.0), [x for x in expected if x[1] >= 0.5 and x[2] == 1]
+        )
+        self.assertEqual(table.ranking(0.5, 1.0)[0][0], self.formulas[0] & minus)
+
+        row = table[minus]
+        self.assertEqual(row.formula_length, len(minus))
+        self.assertEqual(copy.copy(row)._formula_length, len(minus))
+
+    def test_lookup_and_remove_by_formula(self):
+        rows = [AvicennaTruthTableRow(formula) for formula in self.formulas]
+        table = AvicennaTruthTable(rows)
+        table.append(AvicennaTruthTableRow(self.formulas[0]))
+        self.assertEqual(len(table), 4)
+
+        table.remove(rows[1])
+        self.assertNotIn(self.formulas[1], table)
+        self.assertIn(rows[3], table)
+        self.assertRaises(KeyError, lambda: table[self.formulas[1]])
+        self.assert_indices_consistent(table)
+
+        table.remove(rows[1])
+        table.remove(rows[3])
+        self.assertEqual(len(table), 2)
+        self.assert_indices_consistent(table)
+
+    def test_indices_survive_iadd_and_deepcopy(self):
+        table = AvicennaTruthTable(
+            [AvicennaTruthTableRow(formula) for formula in self.formulas[:2]]
+        )
+        table += AvicennaTruthTable(
+            [AvicennaTruthTableRow(formula) for formula in self.formulas[1:]]
+        )
+        self.assertEqual(len(table), 4)
+        self.assert_indices_consistent(table)
+
+        table_copy = copy.deepcopy(table)
+        table_copy.remove(table_copy[0])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(len(table_copy), 3)
+        self.assert_indices_consistent(table)
+        self.assert_indices_consistent(table_copy)
+
+    def test_iadd_realigns_evaluated_rows(self):
+        graph = gg.GrammarGraph.from_grammar(grammar)
+        test_inputs = [
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in ["sqrt(-1)", "sqrt(-2)", "sqrt(4)", "cos(-2)", "sin(3)"]
+        ]
+        table = AvicennaTruthTable()
+        for formula in self.formulas[:2]:
+            row = AvicennaTruthTableRow(formula, table.index)
+            row.evaluate(test_inputs[:3], graph)
+            table.append(row)
+        other = AvicennaTruthTable()
+        for formula in self.formulas[1:]:
+            row = AvicennaTruthTableRow(formula, other.index)
+            row.evaluate(reversed(test_inputs[1:]), graph)
+            other.append(row)
+
+        merged = table + other
+        table += other
+        for result in [table, merged]:
+            self.assertEqual(len(result), 4)
+            self.assert_indices_consistent(result)
+            for row in result:
+                self.assertIs(row.index, result.index)
+                source = table if row.formula in self.formulas[:2] else other
+                expected = {
+                    source.index[position]: bool(source[row.formula].results[position])
+                    for position in numpy.flatnonzero(
+                        source[row.formula].evaluated[: len(source.index)]
+                    )
+                }
+                self.assertEqual(
+                    {
+                        result.index[position]: bool(row.results[position])
+                        for position in numpy.flatnonzero(
+                            row.evaluated[: len(result.index)]
+                        )
+                    },
+                    expected,
+                )
+
+        sqrt_row = table[self.formulas[0]]
+        self.assertEqual(sqrt_row.recall(), 1.0)
+        self.assertAlmostEqual(sqrt_row.specificity(), 0.0)
+        self.assertEqual(len(table[self.formulas[2]]), 4)
+        self.assertAlmostEqual(table[self.formulas[2]].specificity(), 2 / 3)
+
+
+class TestConjunctionSearch(unittest.TestCase):
+    def setUp(self) -> None:
+        graph = gg.GrammarGraph.from_grammar(grammar)
+        test_inputs = {
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in [
+                "sqrt(-1)",
+                "sqrt(-22)",
+                "sqrt(4)",
+                "sqrt(1)",
+                "cos(-2)",
+                "sin(-3)",
+                "tan(5)",
+            ]
+        }
+        formulas = [
+            'exists <function> elem in start: (= elem "cos")',
+            'exists <function> elem in start: (= elem "sqrt")',
+            'exists <maybe_minus> elem in start: (= elem "-")',
+            'forall <number> elem in start: (<= (str.to.int elem) (str.to.int "1"))',
+        ]
+        self.truth_table = AvicennaTruthTable()
+        for formula in formulas:
+            row = AvicennaTruthTableRow(
+                parse_isla(formula, grammar), self.truth_table.index
+            )
+            row.evaluate(test_inputs, graph)
+            self.truth_table.append(row)
+
+    def test_search_accounts_for_all_combinations(self):
+        learner = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        learner.max_conjunction_size = 3
+        base_rows = list(self.truth_table)
+
+        learner.get_conjunctions(self.truth_table)
+
+        self.assertEqual(
+            learner.evaluated_conjunctions + learner.pruned_conjunctions,
+            math.comb(len(base_rows), 2) + math.comb(len(base_rows), 3),
+        )
+        self.assertGreater(learner.pruned_conjunctions, 0)
+
+        expected = set()
+        for size in (2, 3):
+            for combination in itertools.combinations(base_rows, size):
+                conjunction = AviIslearn.get_conjunction(combination)
+                if (
+                    conjunction.recall() >= learner.min_recall
+                    and conjunction.specificity() >= learner.min_specificity
+                    and all(
+                        conjunction.specificity() > row.specificity()
+                        for row in combination
+                    )
+                ):
+                    expected.add(conjunction.formula)
+
+        found = {
+            row.formula
+            for row in self.truth_table
+            if isinstance(row.formula, ConjunctiveFormula)
+        }
+        self.assertEqual(found, expected)
+        self.assertNotEqual(len(found), 0)
+
+    def test_pair_scores_match_conjunctions(self):
+        rows = list(self.truth_table)
+        number_inputs = len(self.truth_table.index)
+        specificity, recall = AviIslearn._score_pairs(
+            self.truth_table.results[: len(rows), :number_inputs],
+            self.truth_table.evaluated[: len(rows), :number_inputs],
+            self.truth_table.index.failing,
+        )
+
+        for i, j in itertools.combinations(range(len(rows)), 2):
+            conjunction = AviIslearn.get_conjunction([rows[i], rows[j]])
+            self.assertAlmostEqual(recall[i, j], conjunction.recall())
+            self.assertAlmostEqual(specificity[i, j], conjunction.specificity())
 
 
 class TestAvicennaIslearn(unittest.TestCase):
@@ -41,12 +410,10 @@ class TestAvicennaIslearn(unittest.TestCase):
             "<digit>",
         ]
 
-        precision_truth_table = AvicennaTruthTable()
-        recall_truth_table = AvicennaTruthTable()
+        truth_table = AvicennaTruthTable()
         result = avi_islearn.learn_failure_invariants(
             self.test_inputs,
-            precision_truth_table,
-            recall_truth_table,
+            truth_table,
             exclude_nonterminals,
         )
 
@@ -64,10 +431,8 @@ class TestAvicennaIslearn(unittest.TestCase):
         # self.test_inputs.update(new_inputs)
         new_inputs = new_inputs.difference(self.test_inputs)
 
-        # precision_truth_table = AvicennaTruthTable()
-        # recall_truth_table = AvicennaTruthTable()
         result = avi_islearn.learn_failure_invariants(
-            new_inputs, precision_truth_table, recall_truth_table, exclude_nonterminals
+            new_inputs, truth_table, exclude_nonterminals
         )
 
         failure_constraints = list(
@@ -76,6 +441,318 @@ class TestAvicennaIslearn(unittest.TestCase):
         for f in failure_constraints:
             print(f)
 
+    def test_disjunctions_explain_two_failure_causes(self):
+        test_inputs = {
+            Input.from_str(grammar, inp, inp_oracle)
+            for inp, inp_oracle in [
+                ("sqrt(-901)", OracleResult.FAILING),
+                ("sqrt(-8)", OracleResult.FAILING),
+                ("tan(-20)", OracleResult.FAILING),
+                ("tan(3)", OracleResult.FAILING),
+                ("cos(1)", OracleResult.PASSING),
+                ("sin(99)", OracleResult.PASSING),
+                ("cos(-5)", OracleResult.PASSING),
+            ]
+        }
+        pattern = """exists <?NONTERMINAL> elem in start:
+                      (= elem <?STRING>)"""
+
+        results = {}
+        for max_disjunction_size in (1, 2):
+            avi_islearn = AviIslearn(
+                grammar,
+                patterns=[pattern],
+                max_disjunction_size=max_disjunction_size,
+            )
+            results[max_disjunction_size] = avi_islearn.learn_failure_invariants(
+                test_inputs, AvicennaTruthTable(), ["<onenine>", "<digit>"]
+            )
+
+        self.assertFalse(
+            any(isinstance(formula, DisjunctiveFormula) for formula, _, _ in results[1])
+        )
+        best_formula, specificity, recall = results[2][0]
+        self.assertIsInstance(best_formula, DisjunctiveFormula)
+        self.assertEqual((specificity, recall), (1.0, 1.0))
+        self.assertEqual(
+            {"sqrt", "tan"},
+            {
+                function
+                for function in ("sqrt", "tan", "sin", "cos")
+                if function in ISLaUnparser(best_formula).unparse()
+            },
+        )
+
+    def test_parallel_evaluation_matches_sequential(self):
+        exclude_nonterminals = [
+            "<digits>",
+            "<maybe_digits>",
+            "<onenine>",
+            "<arith_expr>",
+            "<start>",
+            "<digit>",
+        ]
+        results = []
+        for processes in (None, 2):
+            avi_islearn = AviIslearn(
+                grammar,
+                pattern_file=str(get_pattern_file_path()),
+                processes=processes,
+            )
+            truth_table = AvicennaTruthTable()
+            try:
+                result = avi_islearn.learn_failure_invariants(
+                    self.test_inputs, truth_table, exclude_nonterminals
+                )
+            finally:
+                avi_islearn.close()
+            results.append(result)
+
+        sequential, parallel = results
+        self.assertEqual(sequential, parallel)
+        self.assertNotEqual(len(parallel), 0)
+
+    def test_lazy_greedy_input_selection(self):
+        avi_islearn = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        fuzzer = GrammarFuzzer(grammar)
+        inputs = {Input(fuzzer.fuzz_tree()) for _ in range(60)} | self.test_inputs
+
+        def k_paths(inp):
+            return {
+                path
+                for path in avi_islearn.graph.k_paths_in_tree(
+                    inp.tree.to_parse_tree(), avi_islearn.k
+                )
+                if not isinstance(path[-1], gg.TerminalNode)
+            }
+
+        def greedy_selection(weights, filter_by_kpaths):
+            remaining, covered, result = list(inputs), set(), []
+            max_len_input = max(len(inp.tree) for inp in inputs)
+
+            def score(inp):
+                uncovered = len(k_paths(inp) - covered)
+                if not weights[0]:
+                    return len(inp.tree)
+                if not weights[1]:
+                    return uncovered
+                return weighted_geometric_mean(
+                    [uncovered, max_len_input - len(inp.tree)], weights
+                )
+
+            while remaining:
+                inp = sorted(remaining, key=score, reverse=True)[0]
+                remaining.remove(inp)
+                uncovered = k_paths(inp) - covered
+                if filter_by_kpaths and not uncovered:
+                    continue
+                covered |= uncovered
+                result.append(inp)
+            return result
+
+        for weights in [(1.7, 1.0), (1.0, 0.0), (0.0, 1.0)]:
+            for filter_by_kpaths in (True, False):
+                self.assertEqual(
+                    avi_islearn._sort_inputs(inputs, filter_by_kpaths, *weights),
+                    greedy_selection(weights, filter_by_kpaths),
+                )
+
+    def test_selection_reuses_inputs_and_k_paths(self):
+        avi_islearn = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        selected = avi_islearn.sort_and_filter_inputs(self.test_inputs)
+
+        self.assertTrue(
+            all(any(inp is other for other in self.test_inputs) for inp in selected)
+        )
+        self.assertEqual(set(avi_islearn.k_paths), self.test_inputs)
+        k_paths = {inp: avi_islearn.k_paths[inp] for inp in self.test_inputs}
+        self.assertEqual(avi_islearn.sort_and_filter_inputs(self.test_inputs), selected)
+        for inp in self.test_inputs:
+            self.assertIs(avi_islearn.input_k_paths(inp), k_paths[inp])
+
+    def test_candidates_are_memoized_per_tree(self):
+        avi_islearn = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        failing = sorted(
+            (inp for inp in self.test_inputs if inp.oracle == OracleResult.FAILING),
+            key=str,
+        )
+
+        candidates = avi_islearn.get_candidates(failing[:2])
+        self.assertEqual(len(avi_islearn.instantiations), 2)
+        self.assertEqual(
+            candidates,
+            set().union(
+                *(
+                    avi_islearn.generate_candidates(avi_islearn.patterns, [inp.tree])
+                    for inp in failing[:2]
+                )
+            ),
+        )
+
+        instantiations = dict(avi_islearn.instantiations)
+        candidates = avi_islearn.get_candidates(failing)
+        self.assertEqual(len(avi_islearn.instantiations), len(failing))
+        for key, insts in instantiations.items():
+            self.assertIs(avi_islearn.instantiations[key], insts)
+        self.assertEqual(
+            candidates,
+            set().union(*avi_islearn.instantiations.values()),
+        )
+
+    def test_memoized_candidates_respect_exclusions(self):
+        avi_islearn = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        failing = sorted(
+            (inp for inp in self.test_inputs if inp.oracle == OracleResult.FAILING),
+            key=str,
+        )
+        avi_islearn.get_candidates(failing)
+
+        for exclusions in [{"<function>"}, {"<number>", "<maybe_minus>"}]:
+            avi_islearn.exclude_nonterminals = exclusions
+            with self.assertLogs("learner", level="INFO") as logs:
+                candidates = avi_islearn.get_candidates(failing)
+            self.assertIn("Dropped", logs.output[0])
+            self.assertEqual(len(avi_islearn.instantiations), len(failing))
+            self.assertEqual(avi_islearn.instantiation_exclusions, exclusions)
+            patterns = avi_islearn.pattern_filter.filter(
+                avi_islearn.patterns, exclusions
+            )
+            self.assertEqual(
+                candidates,
+                set().union(
+                    *(
+                        avi_islearn.generate_candidates(patterns, [inp.tree])
+                        for inp in failing
+                    )
+                ),
+            )
+
+    def test_evaluation_counts(self):
+        avi_islearn = AviIslearn(grammar, pattern_file=str(get_pattern_file_path()))
+        avi_islearn.learn_failure_invariants(self.test_inputs, AvicennaTruthTable())
+
+        counts = avi_islearn.evaluation_counts
+        self.assertGreater(counts["strings"], 0)
+        self.assertGreater(counts["evaluator"], 0)
+        self.assertEqual(counts["features"], 0)
+
+    def test_feature_bounds_match_tree_evaluation(self):
+        patterns = [
+            """exists <?NONTERMINAL> elem in start:
+              (>= (str.to.int elem) (str.to.int <?STRING>))""",
+            """exists <?NONTERMINAL> elem in start:
+              (>= (str.len elem) (str.to.int <?STRING>))""",
+        ]
+        collector = GrammarFeatureCollector(grammar)
+        tables = []
+        for with_features in (False, True):
+            test_inputs = {
+                Input.from_str(grammar, str(inp), inp.oracle)
+                for inp in self.test_inputs
+            }
+            if with_features:
+                for inp in test_inputs:
+                    inp.features = collector.collect_features(inp)
+            avi_islearn = AviIslearn(grammar, patterns=patterns)
+            truth_table = AvicennaTruthTable()
+            result = avi_islearn.learn_failure_invariants(test_inputs, truth_table)
+            tables.append((avi_islearn, truth_table, result))
+
+        (_, trees, trees_result), (avi_islearn, features, features_result) = tables
+        self.assertEqual(trees_result, features_result)
+        self.assertGreater(avi_islearn.evaluation_counts["features"], 0)
+        for tree_scores, feature_scores in zip(trees.scores(), features.scores()):
+            self.assertTrue(numpy.array_equal(tree_scores, feature_scores))
+
+    @staticmethod
+    def learn_in_both_precision_modes(test_inputs, max_conjunction_size):
+        tables = []
+        for lazy in (False, True):
+            avi_islearn = AviIslearn(
+                grammar,
+                pattern_file=str(get_pattern_file_path()),
+                lazy_precision=lazy,
+            )
+            avi_islearn.max_conjunction_size = max_conjunction_size
+            truth_table = AvicennaTruthTable()
+            result = avi_islearn.learn_failure_invariants(test_inputs, truth_table)
+            tables.append((truth_table, result))
+        return tables
+
+    def test_lazy_precision_evaluation(self):
+        fuzzer = GrammarFuzzer(grammar)
+        test_inputs = set(self.test_inputs)
+        for _ in range(100):
+            inp = fuzzer.fuzz_tree()
+            test_inputs.add(Input(inp, oracle(str(inp))))
+
+        (exhaustive, exhaustive_result), (
+            lazy,
+            lazy_result,
+        ) = self.learn_in_both_precision_modes(test_inputs, 1)
+        self.assertEqual(exhaustive_result, lazy_result)
+        self.assertLess(
+            numpy.count_nonzero(lazy.evaluated),
+            numpy.count_nonzero(exhaustive.evaluated),
+        )
+        specificity, _ = lazy.scores()
+        for row, row_specificity in zip(lazy, specificity):
+            if row.stopped_early:
+                self.assertLess(row_specificity, 0.6)
+
+    def test_lazy_precision_evaluation_of_conjunctions(self):
+        test_inputs = set(self.test_inputs) | {
+            Input.from_str(grammar, "sqrt(-3)", OracleResult.FAILING),
+            Input.from_str(grammar, "cos(-5)", OracleResult.PASSING),
+        }
+        (exhaustive, exhaustive_result), (
+            lazy,
+            lazy_result,
+        ) = self.learn_in_both_precision_modes(test_inputs, 3)
+        self.assertEqual(exhaustive_result, lazy_result)
+        for formula, specificity, recall in lazy_result:
+            row = exhaustive[formula]
+            self.assertEqual((specificity, recall), (row.specificity(), row.recall()))
+
+    def test_confidence_stop_evaluates_new_inputs(self):
+        test_inputs = {
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in ["sqrt(-901)", "sqrt(-8)"]
+            + [
+                f"{function}({number})"
+                for function in ["cos", "sin", "tan"]
+                for number in range(1, 11)
+            ]
+        }
+        avi_islearn = AviIslearn(
+            grammar,
+            pattern_file=str(get_pattern_file_path()),
+            lazy_precision=True,
+            precision_confidence=0.95,
+        )
+        truth_table = AvicennaTruthTable()
+        avi_islearn.learn_failure_invariants(test_inputs, truth_table)
+        self.assertTrue(any(row.stopped_early for row in truth_table))
+
+        # Rows that stopped confidently above the threshold must still see these.
+        new_inputs = {
+            Input.from_str(grammar, inp, oracle(inp))
+            for inp in ["sqrt(7)", "sqrt(12)", "sqrt(45)"]
+        }
+        avi_islearn.learn_failure_invariants(new_inputs, truth_table)
+
+        positions = truth_table.index.positions(new_inputs)
+        bound = len(avi_islearn.all_negative_inputs) * (1 - avi_islearn.min_specificity)
+        for row in truth_table:
+            passing = ~row.index.failing
+            false_positives = numpy.count_nonzero(
+                row.results[: len(passing)] & row.evaluated[: len(passing)] & passing
+            )
+            self.assertTrue(
+                row.evaluated[positions].all() or false_positives > bound,
+                ISLaUnparser(row.formula).unparse(),
+            )
+
     def test_iterative_addition(self):
         print(str(get_pattern_file_path()))
         fuzzer = GrammarFuzzer(grammar)
@@ -94,10 +771,9 @@ class TestAvicennaIslearn(unittest.TestCase):
             "<digit>",
         ]
 
-        precision_truth_table = AvicennaTruthTable()
-        recall_truth_table = AvicennaTruthTable()
+        truth_table = AvicennaTruthTable()
         result = avi_islearn.learn_failure_invariants(
-            test_inputs, precision_truth_table, recall_truth_table, exclude_nonterminals
+            test_inputs, truth_table, exclude_nonterminals
         )
 
         inputs = [
@@ -115,10 +791,8 @@ class TestAvicennaIslearn(unittest.TestCase):
         new_inputs = new_inputs.difference(test_inputs)
         # new_inputs = test_inputs.union(new_inputs)
 
-        # precision_truth_table = AvicennaTruthTable()
-        # recall_truth_table = AvicennaTruthTable()
         result = avi_islearn.learn_failure_invariants(
-            new_inputs, precision_truth_table, recall_truth_table, exclude_nonterminals
+            new_inputs, truth_table, exclude_nonterminals
         )
 
         failure_constraints = list(
@@ -50,6 +50,31 @@ class TestRelevantFeatureLearner(unittest.TestCase):
             .get()
         )
 
+    def test_learning_matrix_drops_constant_features(self):
+        feature_learner = feature_extractor.DecisionTreeRelevanceLearner(
+            grammar_calculator
+        )
+        test_inputs = list(self.test_inputs)
+        matrix, features, labels = feature_learner.get_learning_matrix(test_inputs)
+
+        self.assertEqual(matrix.shape, (len(test_inputs), len(features)))
+        self.assertNotIn(ExistenceFeature("<start>"), features)
+        self.assertIn(NumericFeature("<number>"), features)
+        self.assertFalse((matrix == -float("inf")).any())
+        self.assertEqual(
+            labels,
+            [int(inp.oracle == OracleResult.FAILING) for inp in test_inputs],
+        )
+
+        data, _ = feature_learner.get_learning_data(test_inputs)
+        self.assertEqual(list(data.columns), features)
+        for row, inp in zip(matrix, test_inputs):
+            for feature, value in zip(features, row):
+                expected = inp.features.get_feature_value(feature)
+                if expected == -float("inf"):
+                    expected = feature_extractor.NO_NUMBER
+                self.assertEqual(value, expected)
+
     def test_relevant_feature_learner(self):
         feature_learner = feature_extractor.DecisionTreeRelevanceLearner(
             grammar_calculator, prune_parent_correlation=False
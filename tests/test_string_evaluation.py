@@ -0,0 +1,101 @@
+import unittest
+
+from isla.evaluator import evaluate
+from isla.language import parse_isla
+from grammar_graph import gg
+
+from avicenna_formalizations.calculator import grammar
+from avicenna.input import Input
+from avicenna.string_evaluation import StringFormula, Bindings, evaluate_batch
+
+
+class TestStringEvaluation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inputs = [
+            Input.from_str(grammar, inp)
+            for inp in ["sqrt(-12.5)", "cos(1)", "tan(-900)", "sin(37)", "sqrt(4.25)"]
+        ]
+        self.graph = gg.GrammarGraph.from_grammar(grammar)
+
+    def test_string_formulas_match_evaluator(self):
+        formulas = [
+            'exists <function> elem in start: (= elem "sqrt")',
+            'exists <maybe_minus> elem in start: (= "-" elem)',
+            'forall <number> elem in start: (not (= elem "1"))',
+            'exists <number> elem in start: (str.contains elem "2")',
+            'exists <digits> elem in start: (str.contains "0123" elem)',
+            'exists <number> elem in start: (str.prefixof "-1" elem)',
+            'exists <number> elem in start: (str.suffixof "5" elem)',
+            'exists <function> elem in start: (str.prefixof elem "tangent")',
+            'forall <number> elem in start: (or (= elem "1") (str.prefixof "-" elem))',
+            'forall <number> container in start: exists <digit> elem in container: (= elem "2")',
+            'forall <digits> container in start: exists <digits> elem in container: (= elem "5")',
+            'forall <digits> container in start: exists <digits> elem in container: (= elem "7")',
+            'exists <number> container in start: forall <digit> elem in start: (not (= elem "0"))',
+        ]
+        for formula in formulas:
+            string_formula = StringFormula.from_formula(parse_isla(formula, grammar))
+            self.assertIsNotNone(string_formula, formula)
+            for inp in self.inputs:
+                self.assertEqual(
+                    string_formula.evaluate(inp.tree_index),
+                    evaluate(
+                        parse_isla(formula, grammar),
+                        inp.tree,
+                        grammar,
+                        graph=self.graph,
+                    ).is_true(),
+                    (formula, str(inp)),
+                )
+
+    def test_batch_matches_evaluator(self):
+        formulas = [
+            parse_isla(formula, grammar)
+            for formula in [
+                'forall <number> container in start: exists <digit> elem in container: (= elem "2")',
+                'forall <number> container in start: exists <digit> elem in container: (= elem "5")',
+                'exists <number> elem in start: (str.prefixof "-" elem)',
+                'exists <number> elem in start: (= elem "1")',
+                'exists <number> elem in start: (>= (str.to.int elem) (str.to.int "1"))',
+            ]
+        ]
+        results = evaluate_batch(formulas, self.inputs, self.graph)
+
+        self.assertEqual(results.shape, (len(formulas), len(self.inputs)))
+        for formula, row in zip(formulas, results):
+            self.assertEqual(
+                list(row),
+                [
+                    evaluate(formula, inp.tree, grammar, graph=self.graph).is_true()
+                    for inp in self.inputs
+                ],
+            )
+
+    def test_bindings_are_shared(self):
+        string_formula = StringFormula.from_formula(
+            parse_isla('exists <number> elem in start: (= elem "1")', grammar)
+        )
+        bindings = Bindings(
+            string_formula.quantifiers,
+            [inp.tree_index for inp in self.inputs + self.inputs],
+        )
+        self.assertEqual(len(bindings.strings), len(self.inputs))
+        self.assertEqual(
+            list(bindings.evaluate(string_formula.predicate)),
+            [False, True, False, False, False] * 2,
+        )
+
+    def test_other_shapes_fall_back(self):
+        for formula in [
+            'exists <number> elem in start: (>= (str.to.int elem) (str.to.int "1"))',
+            "exists <number> elem in start: (= (str.len elem) 2)",
+            "exists <number> elem_1 in start: exists <number> elem_2 in start: "
+            "(= elem_1 elem_2)",
+        ]:
+            self.assertIsNone(
+                StringFormula.from_formula(parse_isla(formula, grammar)), formula
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from isla.evaluator import evaluate
+from isla.language import parse_isla
+from grammar_graph import gg
+from fuzzingbook.Grammars import is_nonterminal
+
+from avicenna_formalizations.calculator import grammar
+from avicenna.input import Input
+from avicenna.evaluation_cache import evaluate_formula
+from avicenna.feature_collector import GrammarFeatureCollector
+from avicenna.features import FeatureVector, tree_to_string
+
+
+def walk_features(collector, tree, feature_vector):
+    """Sets the features of the tree by walking it, as a reference for the index."""
+    (node, children) = tree
+    for feature in collector.get_corresponding_feature(node):
+        feature_vector.set_feature(feature, feature.evaluate(tree))
+    for child in children:
+        if is_nonterminal(child[0]):
+            walk_features(collector, child, feature_vector)
+
+
+class TestTreeIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inp = Input.from_str(grammar, "sqrt(-12)")
+
+    def test_paths_and_strings(self):
+        index = self.inp.tree_index
+
+        self.assertIs(self.inp.tree_index, index)
+        self.assertEqual(index.strings[()], "sqrt(-12)")
+        self.assertEqual(len(index.paths["<start>"]), 1)
+        for path in index.paths["<number>"]:
+            self.assertEqual(index.subtrees[path].value, "<number>")
+            self.assertEqual(index.strings[path], tree_to_string(index.subtrees[path]))
+            self.assertEqual(index.length(path), len(index.strings[path]))
+
+    def test_absent_nonterminals_decide_quantifiers(self):
+        graph = gg.GrammarGraph.from_grammar(grammar)
+        single_digit = Input.from_str(grammar, "cos(1)")
+        self.assertNotIn("<digit>", single_digit.tree_index)
+
+        exists = parse_isla('exists <digit> elem in start: (= elem "1")', grammar)
+        forall = parse_isla('forall <digit> elem in start: (= elem "1")', grammar)
+        self.assertFalse(single_digit.tree_index.decide(exists))
+        self.assertTrue(single_digit.tree_index.decide(-exists))
+        self.assertTrue(single_digit.tree_index.decide(forall))
+        self.assertIsNone(self.inp.tree_index.decide(exists))
+
+        for formula in [exists, forall, -exists]:
+            self.assertEqual(
+                evaluate_formula(formula, single_digit, graph),
+                evaluate(formula, single_digit.tree, grammar, graph=graph).is_true(),
+            )
+
+    def test_features_match_tree_walk(self):
+        collector = GrammarFeatureCollector(grammar)
+        feature_vector = collector.collect_features(self.inp)
+
+        walked = FeatureVector(str(self.inp))
+        for feature in collector.features:
+            walked.set_feature(feature, feature.default_value)
+        walk_features(collector, self.inp.tree, walked)
+
+        self.assertEqual(feature_vector.features, walked.features)
+
+    def test_spans_of_nested_nonterminals(self):
+        digits = {
+            "<start>": ["<digits>"],
+            "<digits>": ["<digit><digits>", "<digit>"],
+            "<digit>": list("0123456789"),
+        }
+        inp = Input.from_str(digits, "9" * 200)
+        index = inp.tree_index
+
+        self.assertEqual(len(index.paths["<digits>"]), 200)
+        for depth, path in enumerate(index.paths["<digits>"]):
+            self.assertEqual(index.length(path), 200 - depth)
+            self.assertEqual(index.strings[path], tree_to_string(index.subtrees[path]))
+
+        collector = GrammarFeatureCollector(digits)
+        walked = FeatureVector(str(inp))
+        walk_features(collector, inp.tree, walked)
+        self.assertEqual(collector.collect_features(inp).features, walked.features)
+
+
+if __name__ == "__main__":
+    unittest.main()